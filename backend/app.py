@@ -1,202 +1,67 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-import os
-import uuid
-from PIL import Image as PILImage
-import re
-import phonenumbers
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'kapcha-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///kapcha.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
-
-db = SQLAlchemy(app)
-jwt = JWTManager(app)
-
-# Create uploads directory
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Models
-class User(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    phone = db.Column(db.String(20), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
-    is_private = db.Column(db.Boolean, default=False)
-    role = db.Column(db.String(20), default='user')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class Image(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    filename = db.Column(db.String(255), nullable=False)
-    original_filename = db.Column(db.String(255), nullable=False)
-    caption = db.Column(db.Text)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    user = db.relationship('User', backref='images')
-
-class Like(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    image_id = db.Column(db.String(36), db.ForeignKey('image.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    user = db.relationship('User', backref='likes')
-    image = db.relationship('Image', backref='likes')
-
-class Comment(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    image_id = db.Column(db.String(36), db.ForeignKey('image.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    user = db.relationship('User', backref='comments')
-    image = db.relationship('Image', backref='comments')
-
-# Helper functions
-def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def save_image(file):
-    if not allowed_file(file.filename):
-        return None
-    
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
-    try:
-        image = PILImage.open(file)
-        if image.mode in ('RGBA', 'P'):
-            image = image.convert('RGB')
-        
-        max_size = (2000, 2000)
-        image.thumbnail(max_size, PILImage.Resampling.LANCZOS)
-        image.save(filepath, 'JPEG', quality=85)
-        return filename
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        return None
-
-def validate_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-def validate_phone(phone):
-    try:
-        parsed = phonenumbers.parse(phone, None)
-        return phonenumbers.is_valid_number(parsed)
-    except:
-        return False
-
-# Routes
-@app.route('/')
-def home():
-    return jsonify({
-        'message': 'Kapcha API is running!',
-        'endpoints': {
-            'register': 'POST /api/register',
-            'login': 'POST /api/login',
-            'images': 'GET /api/images',
-            'upload': 'POST /api/images'
-        },
-        'frontend': 'http://localhost:8000'
-    })
-
-@app.route('/api/register', methods=['POST'])
-def register():
-    try:
-        data = request.get_json()
-        
-        if not data or not all(k in data for k in ['username', 'email', 'phone', 'password']):
-            return jsonify({'error': 'Missing required fields'}), 400
-        
-        if not validate_email(data['email']):
-            return jsonify({'error': 'Invalid email format'}), 400
-        
-        if not validate_phone(data['phone']):
-            return jsonify({'error': 'Invalid phone number'}), 400
-        
-        if User.query.filter_by(username=data['username']).first():
-            return jsonify({'error': 'Username already exists'}), 400
-        
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'Email already exists'}), 400
-        
-        if User.query.filter_by(phone=data['phone']).first():
-            return jsonify({'error': 'Phone number already exists'}), 400
-        
-        user = User(
-            username=data['username'],
-            email=data['email'],
-            phone=data['phone']
-        )
-        user.set_password(data['password'])
-        
-        db.session.add(user)
-        db.session.commit()
-        
-        return jsonify({'message': 'User created successfully'}), 201
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/login', methods=['POST'])
-def login():
-    try:
-        data = request.get_json()
-        
-        user = User.query.filter_by(username=data.get('username')).first()
-        
-        if not user or not user.check_password(data.get('password')):
-            return jsonify({'error': 'Invalid credentials'}), 401
-        
-        from flask_jwt_extended import create_access_token
-        access_token = create_access_token(identity=user.id)
-        
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import load_config
+from database import init_database
+from auth import init_auth_routes
+from commands import init_commands
+from images import init_image_routes
+from ingest import init_ingest
+from instrumentation import init_instrumentation
+from media import send_upload
+from notifications import init_notification_routes
+
+def create_app(config=None):
+    """Build the Flask application.
+
+    `config` is an optional mapping applied on top of the settings from
+    the environment (see config.load_config), read when this runs. Nothing
+    here touches the filesystem or the database; the schema is created
+    and upgraded by the explicit `flask migrate` step, and heavy
+    libraries (Pillow, phonenumbers) load on first use.
+    """
+    app = Flask(__name__)
+    app.config.from_object(load_config())
+    if config:
+        app.config.update(config)
+
+    hops = app.config.get('TRUSTED_PROXY_HOPS', 0)
+    if hops:
+        # request.remote_addr (used by the rate limits) becomes the client's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+    init_database(app)
+    init_instrumentation(app)
+    JWTManager(app)
+    init_ingest(app)
+
+    init_auth_routes(app)
+    init_image_routes(app)
+    init_notification_routes(app)
+    init_commands(app)
+
+    @app.route('/')
+    def home():
         return jsonify({
-            'access_token': access_token,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'is_private': user.is_private
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-# Initialize database
-@app.before_first_request
-def create_tables():
-    db.create_all()
+            'message': 'Kapcha API is running!',
+            'endpoints': {
+                'register': 'POST /api/register',
+                'login': 'POST /api/login',
+                'images': 'GET /api/images',
+                'upload': 'POST /api/images',
+                'notifications': 'GET /api/notifications'
+            },
+            'frontend': 'http://localhost:8000'
+        })
+
+    @app.route('/uploads/<path:filename>')
+    def uploaded_file(filename):
+        return send_upload(filename)
+
+    return app
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
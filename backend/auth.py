@@ -1,91 +1,176 @@
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
 from models import db, User
-import re
-import phonenumbers
+from cache import get_cache
+from passwords import get_hasher, HashingOverloaded
+from ratelimit import check_rate_limits
+from validation import is_valid_email, normalize_phone, init_validation
 
 def validate_email(email):
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return is_valid_email(email)
 
-def validate_phone(phone):
-    try:
-        parsed = phonenumbers.parse(phone, None)
-        return phonenumbers.is_valid_number(parsed)
-    except:
-        return False
+def user_payload(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'is_private': user.is_private
+    }
+
+def get_user_payload(user_id):
+    """Serialized user, read through the cache."""
+    def load():
+        user = db.session.get(User, user_id)
+        return user_payload(user) if user else None
+
+    return get_cache().get_or_set(
+        get_cache().user_key(user_id),
+        current_app.config.get('USER_CACHE_TTL', 300),
+        load
+    )
+
+def find_conflict(username, email, phone):
+    """Check all three unique fields with a single query."""
+    rows = db.session.execute(
+        select(User.username, User.email, User.phone)
+        .where(or_(User.username == username, User.email == email, User.phone == phone))
+        .limit(3)
+    ).all()
+
+    for field, label, value in (('username', 'Username', username),
+                                ('email', 'Email', email),
+                                ('phone', 'Phone number', phone)):
+        if any(getattr(row, field) == value for row in rows):
+            return f"{label} already exists"
+    return None
+
+def _too_many_requests(retry_after):
+    return jsonify({'error': 'Too many requests, please retry later'}), 429, {'Retry-After': str(retry_after)}
 
 def init_auth_routes(app):
     
+    init_validation(app)
+    
+    # Resolve JWT identities through the same cache as /api/me
+    jwt = app.extensions.get('flask-jwt-extended')
+    if jwt:
+        identity_claim = app.config.get('JWT_IDENTITY_CLAIM', 'sub')
+        jwt.user_lookup_loader(lambda _header, data: get_user_payload(data[identity_claim]))
+    
     @app.route('/api/register', methods=['POST'])
     def register():
         data = request.get_json()
         
-        if not all(k in data for k in ['username', 'email', 'phone', 'password']):
+        retry_after = check_rate_limits(
+            (f"register:ip:{request.remote_addr}", app.config.get('REGISTER_LIMIT_PER_IP', 10), app.config.get('REGISTER_LIMIT_WINDOW', 3600)),
+        )
+        if retry_after:
+            return _too_many_requests(retry_after)
+        
+        if not data or not all(k in data for k in ['username', 'email', 'phone', 'password']):
             return jsonify({'error': 'Missing required fields'}), 400
         
         # Validate inputs
         if not validate_email(data['email']):
             return jsonify({'error': 'Invalid email format'}), 400
         
-        if not validate_phone(data['phone']):
+        # Stored as E.164 so differently formatted copies of a number collide
+        phone = normalize_phone(data['phone'])
+        if not phone:
             return jsonify({'error': 'Invalid phone number'}), 400
         
-        if User.query.filter_by(username=data['username']).first():
-            return jsonify({'error': 'Username already exists'}), 400
+        conflict = find_conflict(data['username'], data['email'], phone)
+        if conflict:
+            return jsonify({'error': conflict}), 400
         
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'Email already exists'}), 400
-        
-        if User.query.filter_by(phone=data['phone']).first():
-            return jsonify({'error': 'Phone number already exists'}), 400
+        try:
+            password_hash = get_hasher().hash(data['password'])
+        except HashingOverloaded:
+            return _too_many_requests(1)
         
         user = User(
             username=data['username'],
             email=data['email'],
-            phone=data['phone']
+            phone=phone,
+            password_hash=password_hash
         )
-        user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent registration
+            db.session.rollback()
+            return jsonify({'error': find_conflict(data['username'], data['email'], phone) or 'User already exists'}), 400
+        get_cache().invalidate_user(user.id)
         
         return jsonify({'message': 'User created successfully'}), 201
     
     @app.route('/api/login', methods=['POST'])
     def login():
-        data = request.get_json()
+        data = request.get_json() or {}
+        username = data.get('username')
+        password = data.get('password')
         
-        user = User.query.filter_by(username=data.get('username')).first()
+        if not username or not password:
+            return jsonify({'error': 'Invalid credentials'}), 401
         
-        if not user or not user.check_password(data.get('password')):
+        retry_after = check_rate_limits(
+            (f"login:user:{username}", app.config.get('LOGIN_LIMIT_PER_USERNAME', 10), app.config.get('LOGIN_LIMIT_WINDOW', 60)),
+            (f"login:ip:{request.remote_addr}", app.config.get('LOGIN_LIMIT_PER_IP', 50), app.config.get('LOGIN_LIMIT_WINDOW', 60)),
+        )
+        if retry_after:
+            return _too_many_requests(retry_after)
+        
+        user = User.query.filter_by(username=username).first()
+        if not user:
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        hasher = get_hasher()
+        try:
+            if not hasher.verify(user.password_hash, password):
+                return jsonify({'error': 'Invalid credentials'}), 401
+            
+            # Upgrade hashes made with an older method or work factor while
+            # the plaintext is at hand
+            if hasher.needs_rehash(user.password_hash):
+                user.password_hash = hasher.hash(password)
+                db.session.commit()
+        except HashingOverloaded:
+            return _too_many_requests(1)
+        
         access_token = create_access_token(identity=user.id)
         return jsonify({
             'access_token': access_token,
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'is_private': user.is_private
-            }
+            'user': user_payload(user)
         }), 200
     
     @app.route('/api/me', methods=['GET'])
     @jwt_required()
     def get_current_user():
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = get_user_payload(get_jwt_identity())
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        return jsonify({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'is_private': user.is_private
-        }), 200
\ No newline at end of file
+        return jsonify(user), 200
+    
+    @app.route('/api/profile', methods=['PUT'])
+    @jwt_required()
+    def update_profile():
+        data = request.get_json() or {}
+        user = db.session.get(User, get_jwt_identity())
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        if 'is_private' in data:
+            user.is_private = bool(data['is_private'])
+        
+        db.session.commit()
+        get_cache().invalidate_user(user.id)
+        
+        return jsonify(user_payload(user)), 200
\ No newline at end of file
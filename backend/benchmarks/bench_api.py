@@ -0,0 +1,216 @@
+"""API load benchmark.
+
+Seeds a database with `flask data seed`'s generator, then drives the hot
+endpoints (register, login, feed pages at several cursor depths,
+like/unlike and upload) through the Flask test client or a local HTTP
+server, reporting p50/p95/p99 latency, throughput and peak RSS.
+
+    python benchmarks/bench_api.py --driver client
+    python benchmarks/bench_api.py --driver http --concurrency 8 --json
+    python benchmarks/bench_api.py --database-url postgresql://localhost/kapcha_bench
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from harness import (
+    HTTPDriver, LocalServer, TestClientDriver, bench_config, create_bench_app, peak_rss_mb, run_load
+)
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.test import encode_multipart
+
+FEED_DEPTHS = (0, 10, 50)
+PAGE_SIZE = 20
+
+def _json_request(method, path, payload=None, token=None):
+    headers = {}
+    body = None
+    if payload is not None:
+        headers['Content-Type'] = 'application/json'
+        body = json.dumps(payload).encode()
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    return method, path, headers, body
+
+def _upload_bodies(count, size=(800, 600)):
+    """Distinct small JPEGs encoded up front, so encoding is not timed."""
+    from PIL import Image as PILImage
+
+    bodies = []
+    for index in range(count):
+        image = PILImage.new('RGB', size, (index % 256, (index // 256) % 256, 128))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG')
+        buffer.seek(0)
+        boundary, body = encode_multipart(MultiDict({
+            'image': FileStorage(buffer, filename=f"bench-{index}.jpg", content_type='image/jpeg'),
+            'caption': 'benchmark upload',
+        }))
+        bodies.append(({'Content-Type': f"multipart/form-data; boundary={boundary}"}, body))
+    return bodies
+
+def _feed_cursors(driver, token, depths):
+    """Cursor for each requested page depth, found by walking the feed."""
+    cursors = {0: None}
+    cursor, depth = None, 0
+    while depth < max(depths):
+        path = f"/api/images?limit={PAGE_SIZE}" + (f"&cursor={cursor}" if cursor else '')
+        _, body = driver.request(*_json_request('GET', path, token=token)[:3])
+        cursor = json.loads(body)['next_cursor']
+        if not cursor:
+            break
+        depth += 1
+        if depth in depths:
+            cursors[depth] = cursor
+    return cursors
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='kapcha-bench-')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    config = bench_config(database_url, os.path.join(workdir, 'uploads'))
+    seed = {
+        'users': args.users, 'images': args.images, 'likes': args.likes,
+        'comments': args.comments, 'blobs': 4, 'password': 'password123',
+    }
+
+    try:
+        app, seed_seconds = create_bench_app(config, seed)
+        results = {
+            'driver': args.driver,
+            'concurrency': args.concurrency,
+            'dataset': dict(seed, seed_s=round(seed_seconds, 3)),
+            'scenarios': {},
+        }
+        server = LocalServer(app) if args.driver == 'http' else None
+        if server:
+            server.__enter__()
+            make_driver = lambda: HTTPDriver(server.port)
+        else:
+            make_driver = lambda: TestClientDriver(app)
+
+        try:
+            results['scenarios'] = _run_scenarios(args, make_driver)
+        finally:
+            if server:
+                server.__exit__(None, None, None)
+            from processing import get_processing_pool
+            get_processing_pool(app).shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return results
+
+def _run_scenarios(args, make_driver):
+    scenarios = {}
+    setup = make_driver()
+    registered = itertools.count()
+
+    def login_token(username):
+        _, body = setup.request(*_json_request(
+            'POST', '/api/login', {'username': username, 'password': 'password123'}
+        ))
+        return json.loads(body)['access_token']
+
+    # One fresh account per worker so like/unlike never collides with seeded likes
+    from bulk import synthetic_phone
+    worker_tokens = []
+    for worker in range(args.concurrency):
+        username = f"bench_worker{worker}"
+        setup.request(*_json_request('POST', '/api/register', {
+            'username': username, 'email': f"{username}@example.com",
+            'phone': synthetic_phone(args.users + worker), 'password': 'password123'
+        }))
+        worker_tokens.append(login_token(username))
+
+    def register(worker, index):
+        n = next(registered)
+        return _json_request('POST', '/api/register', {
+            'username': f"bench_user{n}", 'email': f"bench_user{n}@example.com",
+            'phone': synthetic_phone(args.users + args.concurrency + n), 'password': 'password123'
+        })
+    scenarios['register'] = run_load(make_driver, register, args.auth_requests, args.concurrency, ok=(201,))
+
+    def login(worker, index):
+        return _json_request('POST', '/api/login', {
+            'username': f"user{index % args.users}", 'password': 'password123'
+        })
+    scenarios['login'] = run_load(make_driver, login, args.auth_requests, args.concurrency)
+
+    scenarios['feed_anonymous'] = run_load(
+        make_driver, lambda w, i: _json_request('GET', f"/api/images?limit={PAGE_SIZE}"),
+        args.requests, args.concurrency
+    )
+
+    cursors = _feed_cursors(setup, worker_tokens[0], FEED_DEPTHS)
+    for depth, cursor in sorted(cursors.items()):
+        path = f"/api/images?limit={PAGE_SIZE}" + (f"&cursor={cursor}" if cursor else '')
+        scenarios[f"feed_depth_{depth}"] = run_load(
+            make_driver, lambda w, i, path=path: _json_request('GET', path, token=worker_tokens[w]),
+            args.requests, args.concurrency
+        )
+
+    # Each worker's account likes, then unlikes, its own run of images
+    _, body = setup.request(*_json_request('GET', '/api/images?limit=100', token=worker_tokens[0]))
+    image_ids = [image['id'] for image in json.loads(body)['images']]
+    per_worker = min(args.requests // args.concurrency, len(image_ids))
+
+    def like(method):
+        def build(worker, index):
+            path = f"/api/images/{image_ids[index]}/like"
+            return _json_request(method, path, token=worker_tokens[worker])
+        return build
+
+    if per_worker:
+        total = per_worker * args.concurrency
+        scenarios['like'] = run_load(
+            make_driver, like('POST'), total, args.concurrency, ok=(201,), partition=True
+        )
+        scenarios['unlike'] = run_load(
+            make_driver, like('DELETE'), total, args.concurrency, partition=True
+        )
+
+    bodies = _upload_bodies(args.uploads)
+
+    def upload(worker, index):
+        headers, body = bodies[index]
+        headers = dict(headers, Authorization=f"Bearer {worker_tokens[worker]}")
+        return 'POST', '/api/images', headers, body
+    scenarios['upload'] = run_load(make_driver, upload, args.uploads, args.concurrency, ok=(201, 202))
+
+    setup.close()
+    return scenarios
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--driver', choices=('client', 'http'), default='client')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400, help='requests per feed/like scenario')
+    parser.add_argument('--auth-requests', type=int, default=40, help='requests per register/login scenario')
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--images', type=int, default=5000)
+    parser.add_argument('--likes', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file; must point at an empty database')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return results
+
+    print(f"driver={results['driver']} concurrency={results['concurrency']} "
+          f"seeded in {results['dataset']['seed_s']}s, peak RSS {results['peak_rss_mb']} MB")
+    print(f"{'scenario':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, stats in results['scenarios'].items():
+        print(f"{name:<16}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['throughput_rps']:>10}")
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""save_image micro-benchmark.
+
+Times save_image (spool, hash, decode and write every derivative) for
+each combination of source size and format. Every iteration uses
+distinct bytes so content-addressed dedup never short-circuits it.
+
+    python benchmarks/bench_images.py --iterations 10
+"""
+import argparse
+import io
+import json
+import shutil
+import tempfile
+import time
+from harness import bench_config, peak_rss_mb, summarize
+
+SIZES = ((640, 480), (1920, 1080), (4032, 3024))
+FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+def _source(size, fmt, variant):
+    from PIL import Image as PILImage
+
+    # A gradient rather than a flat fill so the encoders do realistic work
+    width, height = size
+    gradient = PILImage.linear_gradient('L').resize(size)
+    image = PILImage.merge('RGB', (gradient, gradient.rotate(90).resize(size), PILImage.new('L', size, variant % 256)))
+    image.putpixel((variant % width, variant // width % height), (variant % 256, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+def run(args):
+    from flask import Flask
+    from werkzeug.datastructures import FileStorage
+    from utils import save_image
+
+    workdir = tempfile.mkdtemp(prefix='kapcha-bench-images-')
+    app = Flask(__name__)
+    app.config.update(bench_config('sqlite://', workdir))
+    results = {'iterations': args.iterations, 'cases': {}}
+
+    try:
+        with app.app_context():
+            for size in SIZES:
+                for fmt in FORMATS:
+                    ext = 'jpg' if fmt == 'JPEG' else fmt.lower()
+                    sources = [_source(size, fmt, variant) for variant in range(args.iterations + 1)]
+                    latencies = []
+                    # The first call warms up the codecs and is not counted
+                    for variant, source in enumerate(sources):
+                        start = time.perf_counter()
+                        save_image(FileStorage(source, filename=f"source.{ext}"))
+                        if variant:
+                            latencies.append(time.perf_counter() - start)
+                    stats = summarize(latencies, sum(latencies))
+                    stats['source_bytes'] = len(sources[0].getvalue())
+                    results['cases'][f"{fmt.lower()}_{size[0]}x{size[1]}"] = stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return results
+
+    print(f"{'case':<18}{'source KB':>11}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, stats in results['cases'].items():
+        print(f"{name:<18}{stats['source_bytes'] // 1024:>11}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['mean_ms']:>10}")
+    print(f"peak RSS {results['peak_rss_mb']} MB")
+    return results
+
+if __name__ == '__main__':
+    main()
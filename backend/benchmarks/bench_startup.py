@@ -0,0 +1,82 @@
+"""Worker startup benchmark.
+
+Each run starts a fresh interpreter that imports the app and calls
+create_app(), the same work a gunicorn worker does on boot, and reports
+the time taken and the peak RSS of the process.
+
+    python benchmarks/bench_startup.py --runs 20
+    python benchmarks/bench_startup.py --eager   # preload Pillow/phonenumbers for comparison
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, resource, sys, time
+start = time.perf_counter()
+if {eager!r}:
+    import PIL.Image, phonenumbers
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'create_app_s': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy_modules': sorted(m for m in ('PIL.Image', 'phonenumbers') if m in sys.modules),
+}}))
+'''
+
+def run_once(eager=False):
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD.format(eager=eager)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - start
+    return result
+
+def summarize(results):
+    def stats(key):
+        values = sorted(r[key] for r in results)
+        return {'median': statistics.median(values), 'min': values[0], 'max': values[-1]}
+
+    return {
+        'runs': len(results),
+        'create_app_s': stats('create_app_s'),
+        'process_s': stats('process_s'),
+        'max_rss_kb': stats('max_rss_kb'),
+        'heavy_modules': results[-1]['heavy_modules'],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--eager', action='store_true', help='import Pillow and phonenumbers up front')
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+    args = parser.parse_args(argv)
+
+    # First run warms the bytecode cache and is discarded
+    run_once(args.eager)
+    summary = summarize([run_once(args.eager) for _ in range(args.runs)])
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return summary
+
+    print(f"runs:            {summary['runs']}")
+    print(f"create_app():    {summary['create_app_s']['median'] * 1000:.1f} ms median "
+          f"({summary['create_app_s']['min'] * 1000:.1f}-{summary['create_app_s']['max'] * 1000:.1f})")
+    print(f"process total:   {summary['process_s']['median'] * 1000:.1f} ms median")
+    print(f"peak RSS:        {summary['max_rss_kb']['median'] / 1024:.1f} MB median")
+    print(f"heavy modules:   {', '.join(summary['heavy_modules']) or 'none'}")
+    return summary
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Shared pieces of the benchmark scripts: app setup, load generation and stats."""
+import http.client
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+def bench_config(database_url, upload_folder, **overrides):
+    """Config for a benchmark app: production defaults minus the rate limits."""
+    config = {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'UPLOAD_FOLDER': upload_folder,
+        'JWT_SECRET_KEY': 'benchmark-' + 'x' * 32,
+        'LOGIN_LIMIT_PER_USERNAME': 10 ** 9,
+        'LOGIN_LIMIT_PER_IP': 10 ** 9,
+        'REGISTER_LIMIT_PER_IP': 10 ** 9,
+    }
+    config.update(overrides)
+    return config
+
+def create_bench_app(config, seed=None):
+    """Build the app, create the schema and optionally seed it.
+
+    `seed` is a dict of bulk.seed_data() arguments. Returns (app, seconds
+    spent seeding).
+    """
+    from app import create_app
+    from bulk import seed_data
+    from migrations import upgrade
+
+    app = create_app(config)
+    seeded = 0.0
+    with app.app_context():
+        upgrade()
+        if seed:
+            start = time.perf_counter()
+            seed_data(**seed)
+            seeded = time.perf_counter() - start
+    return app, seeded
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = (len(sorted_values) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (index - low)
+
+def summarize(latencies, elapsed, errors=0):
+    """Latency percentiles (ms) and throughput for one scenario."""
+    values = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'count': len(values),
+        'errors': errors,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'mean_ms': ms(sum(values) / len(values)) if values else None,
+        'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+    }
+
+class TestClientDriver:
+    """Sends requests through Flask's test client, in process."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers=None, body=None):
+        response = self.client.open(path, method=method, headers=headers or {}, data=body)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+class LocalServer:
+    """Serves the app over HTTP on a random local port from a background thread."""
+
+    def __init__(self, app):
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_KeepAliveHandler)
+        self.port = self.server.port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+class HTTPDriver:
+    """Sends requests over one keep-alive HTTP connection."""
+
+    def __init__(self, port):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, headers=None, body=None):
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (ConnectionError, http.client.HTTPException):
+            # The server dropped the connection; reconnect for the next request
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            return 0, b''
+
+    def close(self):
+        self.conn.close()
+
+def run_load(make_driver, build_request, total, concurrency, ok=(200,), partition=False):
+    """Closed-loop load: `concurrency` workers issue `total` requests between them.
+
+    `build_request(worker, index)` returns (method, path, headers, body).
+    By default workers pull indexes from a shared counter; with
+    `partition` each worker gets an equal share numbered from 0, for
+    requests that must follow a per-worker sequence (like, then unlike).
+    Responses with a status outside `ok` count as errors.
+    Returns summarize() of the latencies.
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def worker(number):
+        driver = make_driver()
+        local, local_errors = [], 0
+        own = iter(range(total // concurrency))
+        try:
+            while True:
+                if partition:
+                    index = next(own, None)
+                else:
+                    with lock:
+                        index = next(counter, None)
+                if index is None:
+                    break
+                method, path, headers, body = build_request(number, index)
+                start = time.perf_counter()
+                status, _ = driver.request(method, path, headers, body)
+                local.append(time.perf_counter() - start)
+                if status not in ok:
+                    local_errors += 1
+        finally:
+            driver.close()
+            with lock:
+                latencies.extend(local)
+                errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - start, errors[0])
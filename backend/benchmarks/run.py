@@ -0,0 +1,149 @@
+"""Run the benchmark suites and record or compare a baseline.
+
+Each suite runs in its own interpreter so peak RSS is per suite. Results
+are flattened into `suite.case.metric` keys and written as JSON; with
+--compare, every latency/RSS metric that grew (or throughput that fell)
+by more than --threshold, and every baseline metric of the selected
+suites that is now missing, is reported and the exit status is 1.
+
+    python benchmarks/run.py --output baseline.json
+    python benchmarks/run.py --compare baseline.json --output latest.json
+    python benchmarks/run.py --suites api-client,images --quick
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+SUITES = {
+    'startup': ('bench_startup.py', [], ['--runs', '3']),
+    'api-client': ('bench_api.py', ['--driver', 'client'], ['--users', '100', '--images', '1000',
+                                                            '--likes', '5000', '--requests', '100',
+                                                            '--auth-requests', '8', '--uploads', '8']),
+    'api-http': ('bench_api.py', ['--driver', 'http'], ['--users', '100', '--images', '1000',
+                                                        '--likes', '5000', '--requests', '100',
+                                                        '--auth-requests', '8', '--uploads', '8']),
+    'images': ('bench_images.py', [], ['--iterations', '2']),
+}
+
+# Suffix -> True if bigger is better
+METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'throughput_rps': True,
+    'peak_rss_mb': False,
+    'create_app_ms': False,
+}
+
+def run_suite(name, quick=False, database_url=None):
+    script, args, quick_args = SUITES[name]
+    command = [sys.executable, os.path.join(BENCH_DIR, script), '--json'] + args
+    if quick:
+        command += quick_args
+    if database_url and script == 'bench_api.py':
+        command += ['--database-url', database_url]
+    out = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+def flatten(name, result):
+    """Pick the comparable metrics out of one suite's JSON."""
+    metrics = {}
+    if name == 'startup':
+        metrics['startup.create_app_ms'] = round(result['create_app_s']['median'] * 1000, 3)
+        metrics['startup.peak_rss_mb'] = round(result['max_rss_kb']['median'] / 1024, 1)
+        return metrics
+
+    cases = result.get('scenarios') or result.get('cases') or {}
+    for case, stats in cases.items():
+        for metric in METRICS:
+            if stats.get(metric) is not None:
+                metrics[f"{name}.{case}.{metric}"] = stats[metric]
+        if stats.get('errors'):
+            metrics[f"{name}.{case}.errors"] = stats['errors']
+    metrics[f"{name}.peak_rss_mb"] = result['peak_rss_mb']
+    return metrics
+
+def compare(baseline, current, threshold):
+    """Return [(key, old, new, change)] for metrics that regressed.
+
+    A baseline metric missing from `current` (a scenario that crashed or
+    was skipped) counts as a regression with `new` None.
+    """
+    regressions = [
+        (key, old, None, None) for key, old in sorted(baseline.items())
+        if key not in current and not key.endswith('.errors')
+    ]
+    for key, new in sorted(current.items()):
+        old = baseline.get(key)
+        if key.endswith('.errors'):
+            if new > (old or 0):
+                regressions.append((key, old or 0, new, None))
+            continue
+        if old in (None, 0):
+            continue
+        higher_is_better = METRICS[key.rsplit('.', 1)[1]]
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append((key, old, new, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"comma-separated, from {', '.join(SUITES)}")
+    parser.add_argument('--quick', action='store_true', help='small datasets and few iterations')
+    parser.add_argument('--database-url', help='run the API suites against this (empty) database')
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--compare', metavar='BASELINE', help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed relative change (default 0.10)')
+    args = parser.parse_args(argv)
+
+    suites = [name.strip() for name in args.suites.split(',') if name.strip()]
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+        },
+        'metrics': {},
+        'suites': {},
+    }
+    for name in suites:
+        print(f"running {name}...", file=sys.stderr)
+        results['suites'][name] = run_suite(name, args.quick, args.database_url)
+        results['metrics'].update(flatten(name, results['suites'][name]))
+
+    for key, value in results['metrics'].items():
+        print(f"{key:<48}{value:>14}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['metrics']
+        # Only the suites run this time are expected to be present
+        baseline = {key: value for key, value in baseline.items() if key.split('.', 1)[0] in suites}
+        regressions = compare(baseline, results['metrics'], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for key, old, new, change in regressions:
+                if new is None:
+                    print(f"  {key:<46}{old:>12} -> missing")
+                    continue
+                delta = f"{change:+.1%}" if change is not None else 'new errors'
+                print(f"  {key:<46}{old:>12} -> {new:<12}{delta}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,572 @@
+import csv
+import io
+import itertools
+import json
+import math
+import os
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import Boolean, DateTime, Integer, JSON, bindparam, insert, select, update
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import generate_password_hash
+from models import db, User, Image, Like, Comment, Notification, Blob, IMAGE_READY
+from repair_counters import recompute_blob_refs, recompute_counters, recompute_unread_counts
+from utils import allowed_file, derivative_filename, save_image, DERIVATIVE_SIZES
+from validation import validate_user_records
+
+MODELS = {
+    'user': User,
+    'blob': Blob,
+    'image': Image,
+    'like': Like,
+    'comment': Comment,
+    'notification': Notification,
+}
+
+FORMATS = ('ndjson', 'csv')
+
+class Checkpoint:
+    """Progress markers persisted as JSON after every committed chunk.
+
+    Each task stores the number of source records (or the last key) it
+    has committed, so an interrupted run restarts from the next chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        self.state[key] = value
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _insert_chunk(table, rows):
+    # A Core executemany, so the statement is compiled once and the driver
+    # batches the rows (multi-row VALUES on Postgres); one transaction per chunk
+    with db.engine.begin() as conn:
+        conn.execute(insert(table), rows)
+
+def _default(column):
+    default = column.default
+    if default is None:
+        return lambda: None
+    if default.is_callable:
+        # SQLAlchemy wraps callable defaults to take an execution context
+        return lambda: default.arg(None)
+    return lambda: default.arg
+
+def _converter(column):
+    if isinstance(column.type, DateTime):
+        parse = lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value
+    elif isinstance(column.type, Boolean):
+        parse = lambda value: value.lower() in ('1', 'true', 'yes') if isinstance(value, str) else bool(value)
+    elif isinstance(column.type, Integer):
+        parse = int
+    elif isinstance(column.type, JSON):
+        parse = lambda value: json.loads(value) if isinstance(value, str) else value
+    else:
+        parse = lambda value: value
+
+    nullable = column.nullable
+    def convert(value):
+        if value is None or (value == '' and nullable):
+            return None
+        return parse(value)
+    return convert
+
+def row_builder(table, defaults=None):
+    """Return a function turning a record into a full row for `table`.
+
+    Missing columns get the value in `defaults` or else their Python-side
+    default, since executemany needs the same keys in every row.
+    Converters are resolved once per table rather than per value.
+    """
+    defaults = defaults or {}
+    columns = [
+        (column.name, _converter(column),
+         (lambda value=defaults[column.name]: value) if column.name in defaults else _default(column))
+        for column in table.columns
+    ]
+
+    def build(record):
+        return {
+            name: convert(record[name]) if name in record else default()
+            for name, convert, default in columns
+        }
+    return build
+
+def _dump(column, value, fmt):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if fmt == 'csv':
+        if value is None:
+            return ''
+        if isinstance(column.type, JSON):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+    return value
+
+def read_records(stream, fmt):
+    """Stream dicts from an NDJSON or CSV file object."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def export_rows(model, out, fmt='ndjson', batch_size=1000, checkpoint=None):
+    """Write every row of `model` to `out`, paging by primary key.
+
+    Each page is a keyset query on the primary key, so memory stays flat
+    and the export can resume after the last key in `checkpoint`.
+    Returns the number of rows written.
+    """
+    table = model.__table__
+    columns = list(table.columns)
+    key = table.primary_key.columns.values()[0]
+    task = f"export:{table.name}"
+    last = checkpoint.get(task) if checkpoint else None
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        if last is None:
+            writer.writerow([column.name for column in columns])
+
+    written = 0
+    while True:
+        query = select(table).order_by(key).limit(batch_size)
+        if last is not None:
+            query = query.where(key > last)
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        if not rows:
+            break
+
+        for row in rows:
+            values = [_dump(column, value, fmt) for column, value in zip(columns, row)]
+            if writer:
+                writer.writerow(values)
+            else:
+                out.write(json.dumps(dict(zip((c.name for c in columns), values))) + '\n')
+        out.flush()
+
+        written += len(rows)
+        last = getattr(rows[-1], key.name)
+        if checkpoint:
+            checkpoint.set(task, last)
+    return written
+
+def _user_rows(records, rejects):
+    method = current_app.config.get('PASSWORD_HASH_METHOD')
+    for record, error in validate_user_records(records):
+        if error:
+            rejects.append((record, error))
+            continue
+        if not record.get('password_hash') and record.get('password'):
+            record['password_hash'] = generate_password_hash(record['password'], method)
+        yield record
+
+def import_records(model, records, batch_size=1000, checkpoint=None, task=None, log=None):
+    """Bulk-insert `records` (dicts) into `model`'s table.
+
+    Rows go in with one Core INSERT per chunk of `batch_size` source
+    records, each chunk committed on its own and recorded in
+    `checkpoint` under `task`. Users are validated and their phones
+    normalized first; a plain `password` is hashed if no `password_hash`
+    is given. Denormalized counters, and blob references for images,
+    are recomputed at the end.
+    Returns {'inserted', 'rejected', 'skipped'}.
+    """
+    table = model.__table__
+    task = task or f"import:{table.name}"
+    done = checkpoint.get(task, 0) if checkpoint else 0
+    stats = {'inserted': 0, 'rejected': 0, 'skipped': done}
+    # Imported images come with their files already in UPLOAD_FOLDER and
+    # nothing will process them, so they are published unless told otherwise
+    build = row_builder(table, {'status': IMAGE_READY} if model is Image else None)
+
+    for chunk in _chunks(itertools.islice(records, done, None), batch_size):
+        rejects = []
+        rows = _user_rows(chunk, rejects) if model is User else chunk
+        rows = [build(record) for record in rows]
+        if rows:
+            _insert_chunk(table, rows)
+
+        done += len(chunk)
+        stats['inserted'] += len(rows)
+        stats['rejected'] += len(rejects)
+        if checkpoint:
+            checkpoint.set(task, done)
+        if log:
+            for record, error in rejects:
+                log(f"rejected {record.get('username') or record.get('id')}: {error}")
+            log(f"{table.name}: {done} records processed")
+
+    if model in (Like, Comment, Image):
+        with db.engine.begin() as conn:
+            recompute_counters(conn)
+    if model in (Notification, User):
+        with db.engine.begin() as conn:
+            recompute_unread_counts(conn)
+    if model in (Blob, Image):
+        with db.engine.begin() as conn:
+            recompute_blob_refs(conn)
+    return stats
+
+def image_entries(source, user_id=None):
+    """Ingestion entries from a directory of images or an NDJSON/CSV manifest.
+
+    Directory entries are owned by `user_id`. Manifest records carry a
+    `path` (relative to the manifest) and `user_id` or `username`, plus
+    optional `caption` and `created_at`.
+    """
+    if os.path.isdir(source):
+        for folder, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if allowed_file(name):
+                    yield {'path': os.path.join(folder, name), 'user_id': user_id}
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    usernames = {}
+    with open(source, newline='') as f:
+        fmt = 'csv' if source.endswith('.csv') else 'ndjson'
+        for record in read_records(f, fmt):
+            entry = dict(record, path=os.path.join(base, record['path']))
+            if not entry.get('user_id') and entry.get('username'):
+                name = entry['username']
+                if name not in usernames:
+                    usernames[name] = db.session.execute(
+                        select(User.id).where(User.username == name)
+                    ).scalar()
+                entry['user_id'] = usernames[name]
+            entry.setdefault('user_id', user_id)
+            yield entry
+
+def _derivative_sizes(filename):
+    from PIL import Image as PILImage
+    from storage import get_blob_store
+
+    store = get_blob_store()
+    sizes = {}
+    for size, _ in DERIVATIVE_SIZES:
+        with PILImage.open(store.path(derivative_filename(filename, size, 'jpeg'))) as image:
+            sizes[size] = list(image.size)
+    return sizes
+
+def _ingest_one(app, entry):
+    with app.app_context():
+        try:
+            with open(entry['path'], 'rb') as f:
+                filename = save_image(FileStorage(stream=f, filename=os.path.basename(entry['path'])))
+            if filename is None:
+                return entry, None, 'File type not allowed'
+            return entry, (filename, _derivative_sizes(filename)), None
+        except Exception as e:
+            return entry, None, str(e)
+
+def _acquire_blobs(conn, blobs):
+    """Add references to blobs, creating missing rows.
+
+    `blobs` maps digest -> (filename, derivatives, references).
+    """
+    existing = set(conn.execute(select(Blob.hash).where(Blob.hash.in_(list(blobs)))).scalars())
+    if existing:
+        conn.execute(
+            update(Blob).where(Blob.hash == bindparam('digest'))
+            .values(ref_count=Blob.ref_count + bindparam('refs')),
+            [{'digest': digest, 'refs': blobs[digest][2]} for digest in existing]
+        )
+    new = [
+        {'hash': digest, 'filename': filename, 'status': IMAGE_READY, 'derivatives': sizes,
+         'ref_count': refs, 'created_at': datetime.utcnow()}
+        for digest, (filename, sizes, refs) in blobs.items() if digest not in existing
+    ]
+    if new:
+        conn.execute(insert(Blob), new)
+
+def ingest_images(entries, workers=4, batch_size=100, checkpoint=None, task='ingest', log=None):
+    """Run image files through save_image in parallel and insert Image rows.
+
+    Decoding and resizing release the GIL inside Pillow, so a thread pool
+    spreads the work over `workers` cores. Each chunk's Image rows and
+    blob references are committed together and then checkpointed.
+    Returns {'inserted', 'rejected', 'skipped'}.
+    """
+    app = current_app._get_current_object()
+    done = checkpoint.get(task, 0) if checkpoint else 0
+    stats = {'inserted': 0, 'rejected': 0, 'skipped': done}
+    build = row_builder(Image.__table__)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as executor:
+        for chunk in _chunks(itertools.islice(entries, done, None), batch_size):
+            rows, blobs = [], {}
+            for entry, saved, error in executor.map(lambda e: _ingest_one(app, e), chunk):
+                if error or not entry.get('user_id'):
+                    stats['rejected'] += 1
+                    if log:
+                        log(f"rejected {entry['path']}: {error or 'Unknown user'}")
+                    continue
+
+                filename, sizes = saved
+                digest = os.path.splitext(os.path.basename(filename))[0]
+                row = build({
+                    'filename': filename,
+                    'original_filename': os.path.basename(entry['path']),
+                    'caption': entry.get('caption') or '',
+                    'user_id': entry['user_id'],
+                    'created_at': entry.get('created_at') or datetime.utcnow(),
+                    'status': IMAGE_READY,
+                    'derivatives': sizes,
+                    'content_hash': digest,
+                })
+                rows.append(row)
+                refs = blobs[digest][2] if digest in blobs else 0
+                blobs[digest] = (filename, sizes, refs + 1)
+
+            if rows:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(Image), rows)
+                    _acquire_blobs(conn, blobs)
+
+            done += len(chunk)
+            stats['inserted'] += len(rows)
+            if checkpoint:
+                checkpoint.set(task, done)
+            if log:
+                log(f"images: {done} files processed")
+    return stats
+
+def _synthetic_id(kind, seed, index):
+    # Deterministic ids let a resumed run refer to rows from earlier chunks
+    return str(uuid.UUID(int=(kind << 120) | ((seed & 0xFFFFFFFFFFFFFF) << 64) | index))
+
+# Exchanges 200-999 of each are valid, so every code covers 8M numbers
+SYNTHETIC_AREA_CODES = (212, 213, 312, 415, 617, 718)
+
+def synthetic_phone(index):
+    # Unique, valid E.164 numbers so seeded users survive an export/import
+    area = SYNTHETIC_AREA_CODES[index // 8000000]
+    index %= 8000000
+    return f"+1{area}{200 + index // 10000:03d}{index % 10000:04d}"
+
+def power_law_counts(n, total, alpha, cap, rng):
+    """Split `total` events over `n` items with Zipf(alpha) popularity.
+
+    Item ranks are shuffled so popularity is not tied to creation order.
+    Counts are capped at `cap` (e.g. one like per user per image) and the
+    excess is spread over the remaining items in proportion to their
+    weight, so the total is kept whenever n * cap allows it.
+    """
+    if n == 0:
+        return []
+    ranks = list(range(1, n + 1))
+    rng.shuffle(ranks)
+    weights = [rank ** -alpha for rank in ranks]
+
+    # Capping only ever hits the heaviest items, so walk them in order
+    remaining, weight_left = min(total, n * cap), math.fsum(weights)
+    expected = [0.0] * n
+    order = sorted(range(n), key=weights.__getitem__, reverse=True)
+    for position, i in enumerate(order):
+        share = remaining * weights[i] / weight_left if weight_left else 0.0
+        if share < cap:
+            scale = remaining / weight_left
+            for j in order[position:]:
+                expected[j] = weights[j] * scale
+            break
+        expected[i] = cap
+        remaining -= cap
+        weight_left -= weights[i]
+
+    return [min(cap, int(e) + (rng.random() < e - int(e))) for e in expected]
+
+COMMENT_WORDS = (
+    'love', 'this', 'great', 'shot', 'amazing', 'colors', 'light', 'wow',
+    'beautiful', 'nice', 'where', 'is', 'that', 'so', 'cool', 'perfect',
+)
+
+def _placeholder_images(count, seed, workers):
+    """Generate `count` small distinct JPEGs and run them through save_image."""
+    from PIL import Image as PILImage
+
+    app = current_app._get_current_object()
+
+    def make(index):
+        rng = random.Random(f"{seed}:blob:{index}")
+        color = tuple(rng.randrange(256) for _ in range(3))
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (rng.randrange(640, 1600), rng.randrange(480, 1200)), color).save(buffer, 'JPEG')
+        buffer.seek(0)
+        with app.app_context():
+            filename = save_image(FileStorage(stream=buffer, filename=f"seed-{index}.jpg"))
+            return filename, _derivative_sizes(filename)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(make, range(count)))
+
+def seed_data(users=1000, images=10000, likes=100000, comments=20000, alpha=1.1,
+              days=365, blobs=16, seed=1, password='password123', batch_size=1000,
+              workers=4, checkpoint=None, log=None):
+    """Insert a synthetic dataset with power-law likes and comments per image.
+
+    Everything is derived from `seed`, so an interrupted run with the same
+    arguments and checkpoint resumes where it stopped. Users are
+    user<N>@example.com and share one password hash; images point at
+    `blobs` real placeholder files processed through save_image.
+    """
+    counts_rng = random.Random(f"{seed}:counts")
+    like_counts = power_law_counts(images, likes, alpha, users, counts_rng)
+    comment_counts = power_law_counts(images, comments, alpha, comments, counts_rng)
+    # Anchored to midnight so a resumed run produces the same timestamps
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days)
+    span = timedelta(days=days).total_seconds()
+
+    def user_id(index):
+        return _synthetic_id(1, seed, index)
+
+    def image_id(index):
+        return _synthetic_id(2, seed, index)
+
+    def image_time(index):
+        return start + timedelta(seconds=span * index / max(images, 1))
+
+    stats = {}
+
+    def run(phase, total, make_rows, step=batch_size):
+        # make_rows(offset, end) returns (table, rows) for items offset..end-1;
+        # each step is one transaction, then checkpointed
+        task = f"seed:{phase}"
+        done = checkpoint.get(task, 0) if checkpoint else 0
+        inserted = 0
+        while done < total:
+            end = min(done + step, total)
+            table, rows = make_rows(done, end)
+            with db.engine.begin() as conn:
+                for part in _chunks(rows, batch_size):
+                    conn.execute(insert(table), part)
+                    inserted += len(part)
+            done = end
+            if checkpoint:
+                checkpoint.set(task, done)
+            if log:
+                log(f"{phase}: {done}/{total}")
+        stats[phase] = inserted
+
+    password_hash = generate_password_hash(password, current_app.config.get('PASSWORD_HASH_METHOD'))
+
+    def user_rows(offset, end):
+        return User.__table__, [{
+            'id': user_id(i),
+            'username': f"user{i}",
+            'email': f"user{i}@example.com",
+            'phone': synthetic_phone(i),
+            'password_hash': password_hash,
+            'is_private': False,
+            'role': 'user',
+            'created_at': start,
+            'unread_count': 0,
+        } for i in range(offset, end)]
+
+    run('users', users, user_rows)
+
+    placeholders = []
+    if users and images and blobs:
+        placeholders = _placeholder_images(blobs, seed, workers)
+        if not (checkpoint and checkpoint.get('seed:blobs')):
+            refs = {}
+            for index, (filename, sizes) in enumerate(placeholders):
+                digest = os.path.splitext(os.path.basename(filename))[0]
+                count = len(range(index, images, len(placeholders)))
+                refs[digest] = (filename, sizes, count)
+            with db.engine.begin() as conn:
+                _acquire_blobs(conn, refs)
+            if checkpoint:
+                checkpoint.set('seed:blobs', len(placeholders))
+
+    def image_rows(offset, end):
+        rows = []
+        for i in range(offset, end):
+            rng = random.Random(f"{seed}:image:{i}")
+            filename, sizes = placeholders[i % len(placeholders)] if placeholders else (f"seed/{image_id(i)}.jpg", None)
+            rows.append({
+                'id': image_id(i),
+                'filename': filename,
+                'original_filename': f"photo-{i}.jpg",
+                'caption': ' '.join(rng.choices(COMMENT_WORDS, k=rng.randrange(0, 6))),
+                'user_id': user_id(rng.randrange(users)),
+                'created_at': image_time(i),
+                'status': IMAGE_READY,
+                'derivatives': sizes,
+                'content_hash': os.path.splitext(os.path.basename(filename))[0] if placeholders else None,
+                'like_count': like_counts[i],
+                'comment_count': comment_counts[i],
+            })
+        return Image.__table__, rows
+
+    run('images', images if users else 0, image_rows)
+
+    def interaction_rows(table, counts, make):
+        def rows_for(offset, end):
+            # A generator, since one popular image can have millions of rows
+            rows = (
+                row
+                for i in range(offset, end) if counts[i]
+                for row in make(i, random.Random(f"{seed}:{table.name}:{i}"), counts[i])
+            )
+            return table, rows
+        return rows_for
+
+    def make_likes(i, rng, count):
+        created = image_time(i)
+        return ({
+            'id': str(uuid.uuid4()),
+            'user_id': user_id(u),
+            'image_id': image_id(i),
+            'created_at': created + timedelta(seconds=rng.randrange(1, 86400 * 7)),
+        } for u in rng.sample(range(users), count))
+
+    def make_comments(i, rng, count):
+        created = image_time(i)
+        return ({
+            'id': str(uuid.uuid4()),
+            'content': ' '.join(rng.choices(COMMENT_WORDS, k=rng.randrange(1, 12))),
+            'user_id': user_id(rng.randrange(users)),
+            'image_id': image_id(i),
+            'created_at': created + timedelta(seconds=rng.randrange(1, 86400 * 7)),
+        } for _ in range(count))
+
+    # Chunk by images, so a checkpoint always falls on an image boundary
+    per_image = max(1, batch_size * max(images, 1) // max(likes, 1))
+    run('likes', images if users else 0, interaction_rows(Like.__table__, like_counts, make_likes), per_image)
+    per_image = max(1, batch_size * max(images, 1) // max(comments, 1))
+    run('comments', images if users else 0, interaction_rows(Comment.__table__, comment_counts, make_comments), per_image)
+    return stats
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from flask import current_app
+
+class MemoryCache:
+    """In-process TTL cache with LRU eviction.
+
+    Each server worker has its own copy, so invalidations only reach the
+    worker that performed the write; TTLs bound how stale other workers
+    can get. Use RedisCache when that matters.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        # Counters (the feed generation) live outside the LRU: evicting one
+        # would reset it and let new keys collide with older cached pages
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (time.monotonic() + ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+                self._counters.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class RedisCache:
+    """Cache backed by a Redis-compatible server, shared by all workers."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_URL points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+class Cache:
+    """Read-through cache with hit/miss counters per key namespace."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def get_or_set(self, key, ttl, loader):
+        namespace = key.split(':', 1)[0]
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits[namespace] += 1
+            return value
+
+        self.misses[namespace] += 1
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value, ttl)
+        return value
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def stats(self):
+        return {
+            namespace: {'hits': self.hits[namespace], 'misses': self.misses[namespace]}
+            for namespace in set(self.hits) | set(self.misses)
+        }
+
+    # Keys and invalidation hooks
+
+    def user_key(self, user_id):
+        return f"user:{user_id}"
+
+    def feed_key(self, limit, user_id=None):
+        # Feed pages are namespaced by a generation counter so a single
+        # increment invalidates every cached page at once
+        generation = self.backend.get('feedgen') or 0
+        return f"feed:{generation}:{limit}:{user_id or ''}"
+
+    def invalidate_user(self, user_id):
+        self.delete(self.user_key(user_id))
+
+    def invalidate_feed(self):
+        self.backend.incr('feedgen')
+
+def create_cache(config):
+    url = config.get('CACHE_URL')
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        backend = RedisCache(url)
+    else:
+        backend = MemoryCache(config.get('CACHE_MAX_ENTRIES', 10000))
+    return Cache(backend)
+
+def get_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('cache')
+    if cache is None:
+        cache = app.extensions.setdefault('cache', create_cache(app.config))
+    return cache
@@ -0,0 +1,138 @@
+import sys
+from contextlib import nullcontext
+import click
+from flask.cli import AppGroup
+from migrations import upgrade
+
+def init_commands(app):
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Create the schema or apply pending revisions."""
+        applied = upgrade()
+        if applied:
+            click.echo(f"Applied {', '.join(applied)}")
+        else:
+            click.echo('Schema is up to date')
+
+    @app.cli.command('create-admin')
+    def create_admin_command():
+        """Create the admin user from ADMIN_* environment variables."""
+        from create_admin import create_admin_user
+        try:
+            create_admin_user()
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    @app.cli.command('repair-counters')
+    def repair_counters_command():
+        """Recompute like, comment and unread counters."""
+        from repair_counters import repair_counters
+        repair_counters()
+
+    app.cli.add_command(data_cli)
+
+data_cli = AppGroup('data', help='Bulk import, export and seeding.')
+
+def _format_for(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'ndjson'
+
+def _open(path, mode):
+    # click.open_file has no newline argument, which the csv module needs
+    if path == '-':
+        return nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, newline='')
+
+def _log(message):
+    click.echo(message, err=True)
+
+@data_cli.command('export')
+@click.argument('model', type=click.Choice(['user', 'blob', 'image', 'like', 'comment', 'notification']))
+@click.argument('output', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--checkpoint', type=click.Path(), help='Resume after the last exported key.')
+def export_command(model, output, fmt, batch_size, checkpoint):
+    """Stream MODEL rows to OUTPUT ('-' for stdout)."""
+    from bulk import Checkpoint, MODELS, export_rows
+
+    checkpoint = Checkpoint(checkpoint) if checkpoint else None
+    resuming = bool(checkpoint and checkpoint.get(f"export:{MODELS[model].__tablename__}"))
+    with _open(output, 'a' if resuming else 'w') as out:
+        written = export_rows(MODELS[model], out, _format_for(output, fmt), batch_size, checkpoint)
+    _log(f"Exported {written} {model} rows")
+
+@data_cli.command('import')
+@click.argument('model', type=click.Choice(['user', 'blob', 'image', 'like', 'comment', 'notification']))
+@click.argument('source', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--checkpoint', type=click.Path(), help='Skip records committed by an earlier run.')
+def import_command(model, source, fmt, batch_size, checkpoint):
+    """Bulk-insert MODEL rows from SOURCE ('-' for stdin).
+
+    Import in dependency order: user, blob, image, then like, comment
+    and notification. Image and blob rows reference files that must
+    already be in UPLOAD_FOLDER; use ingest-images to process new files.
+    Blob rows missing from the import are rebuilt from the images.
+    """
+    from bulk import Checkpoint, MODELS, import_records, read_records
+
+    checkpoint = Checkpoint(checkpoint) if checkpoint else None
+    with _open(source, 'r') as f:
+        stats = import_records(
+            MODELS[model], read_records(f, _format_for(source, fmt)),
+            batch_size=batch_size, checkpoint=checkpoint,
+            task=f"import:{model}:{source}", log=_log
+        )
+    _log(f"Imported {stats['inserted']} {model} rows "
+         f"({stats['rejected']} rejected, {stats['skipped']} skipped from checkpoint)")
+
+@data_cli.command('ingest-images')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--user', 'username', help='Owner of every image when SOURCE is a directory.')
+@click.option('--workers', default=4, show_default=True)
+@click.option('--batch-size', default=100, show_default=True)
+@click.option('--checkpoint', type=click.Path(), help='Skip files committed by an earlier run.')
+def ingest_images_command(source, username, workers, batch_size, checkpoint):
+    """Process image files from a directory or an NDJSON/CSV manifest."""
+    from sqlalchemy import select
+    from bulk import Checkpoint, image_entries, ingest_images
+    from models import db, User
+
+    user_id = None
+    if username:
+        user_id = db.session.execute(select(User.id).where(User.username == username)).scalar()
+        if user_id is None:
+            raise click.BadParameter(f"No user named {username}", param_hint='--user')
+
+    checkpoint = Checkpoint(checkpoint) if checkpoint else None
+    stats = ingest_images(
+        image_entries(source, user_id), workers=workers, batch_size=batch_size,
+        checkpoint=checkpoint, task=f"ingest:{source}", log=_log
+    )
+    _log(f"Ingested {stats['inserted']} images "
+         f"({stats['rejected']} rejected, {stats['skipped']} skipped from checkpoint)")
+
+@data_cli.command('seed')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--images', default=10000, show_default=True)
+@click.option('--likes', default=100000, show_default=True)
+@click.option('--comments', default=20000, show_default=True)
+@click.option('--alpha', default=1.1, show_default=True, help='Zipf exponent for likes/comments per image.')
+@click.option('--days', default=365, show_default=True, help='Spread image creation times over this many days.')
+@click.option('--blobs', default=16, show_default=True, help='Distinct placeholder files shared by the images.')
+@click.option('--seed', default=1, show_default=True)
+@click.option('--password', default='password123', show_default=True, help='Password of every seeded user.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--workers', default=4, show_default=True)
+@click.option('--checkpoint', type=click.Path(), help='Resume an interrupted run with the same options.')
+def seed_command(checkpoint, **options):
+    """Generate a synthetic dataset for capacity testing."""
+    from bulk import Checkpoint, seed_data
+
+    checkpoint = Checkpoint(checkpoint) if checkpoint else None
+    stats = seed_data(checkpoint=checkpoint, log=_log, **options)
+    _log('Seeded ' + ', '.join(f"{count} {phase}" for phase, count in stats.items()))
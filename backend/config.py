@@ -1,24 +1,110 @@
 import os
 from datetime import timedelta
-from dotenv import load_dotenv
 
-load_dotenv()  # Load environment variables from .env file
+def load_config():
+    """Settings read from the environment as it is at call time.
 
-class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'kapcha-secret-key'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///kapcha.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
-    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
-    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(
-        seconds=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 86400))
-    )
-    
-    # Email configuration
-    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-    MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
-    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
-    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
\ No newline at end of file
+    Nothing is read from disk here: entry points (wsgi.py, `python
+    app.py`, the `flask` CLI) load .env into the environment first.
+    """
+    class Config:
+        SECRET_KEY = os.environ.get('SECRET_KEY') or 'kapcha-secret-key'
+        SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///kapcha.db'
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        # Optional read replica for the feed, profile and comment listings
+        SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL', '')
+        
+        # SQLite: WAL journal, busy timeout (ms) and memory-mapped I/O size (bytes)
+        SQLITE_WAL = os.environ.get('SQLITE_WAL', 'True').lower() == 'true'
+        SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+        SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+        
+        # Connection pool for server databases (Postgres etc.)
+        DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+        DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+        DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+        DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+        DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+        UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
+        MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+        JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
+        JWT_ACCESS_TOKEN_EXPIRES = timedelta(
+            seconds=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 86400))
+        )
+        
+        # Phone validation: comma-separated ISO regions to accept (empty = any)
+        PHONE_REGIONS = os.environ.get('PHONE_REGIONS', '')
+        PHONE_DEFAULT_REGION = os.environ.get('PHONE_DEFAULT_REGION', '')
+        
+        # Password hashing runs on a bounded pool; requests beyond
+        # HASH_WORKERS + HASH_QUEUE_DEPTH pending hashes get 429
+        PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        HASH_WORKERS = int(os.environ.get('HASH_WORKERS', 2))
+        HASH_QUEUE_DEPTH = int(os.environ.get('HASH_QUEUE_DEPTH', 16))
+        
+        # Rate limits (per process, sliding window in seconds)
+        LOGIN_LIMIT_PER_USERNAME = int(os.environ.get('LOGIN_LIMIT_PER_USERNAME', 10))
+        LOGIN_LIMIT_PER_IP = int(os.environ.get('LOGIN_LIMIT_PER_IP', 50))
+        LOGIN_LIMIT_WINDOW = int(os.environ.get('LOGIN_LIMIT_WINDOW', 60))
+        REGISTER_LIMIT_PER_IP = int(os.environ.get('REGISTER_LIMIT_PER_IP', 10))
+        REGISTER_LIMIT_WINDOW = int(os.environ.get('REGISTER_LIMIT_WINDOW', 3600))
+        # Number of reverse proxies (nginx, Apache, a load balancer) in front of
+        # the app whose X-Forwarded-For/-Proto are trusted, so per-IP limits see
+        # the client instead of the proxy. Leave at 0 when clients connect directly
+        TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+        
+        # Background image processing
+        IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+        IMAGE_QUEUE_SIZE = int(os.environ.get('IMAGE_QUEUE_SIZE', 32))
+        IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 40_000_000))
+        # Start method for the worker processes; forking a threaded server is unsafe
+        IMAGE_MP_CONTEXT = os.environ.get('IMAGE_MP_CONTEXT', 'forkserver' if os.name == 'posix' else 'spawn')
+        
+        # Upload ingestion: files above this size are spooled to INGEST_TMP_DIR
+        INGEST_SPOOL_MAX_MEMORY = int(os.environ.get('INGEST_SPOOL_MAX_MEMORY', 1024 * 1024))
+        INGEST_TMP_DIR = os.environ.get('INGEST_TMP_DIR')
+        
+        # Serving /uploads: MEDIA_OFFLOAD is '', 'x-sendfile' or 'x-accel-redirect'
+        MEDIA_OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '')
+        MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/_protected_uploads/')
+        MEDIA_CACHE_BYTES = int(os.environ.get('MEDIA_CACHE_BYTES', 64 * 1024 * 1024))
+        MEDIA_CACHE_MAX_ITEM_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_ITEM_BYTES', 256 * 1024))
+        
+        # Caching: CACHE_URL may point at a Redis-compatible server, otherwise
+        # an in-process cache is used
+        CACHE_URL = os.environ.get('CACHE_URL', '')
+        CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+        USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+        FEED_CACHE_TTL = int(os.environ.get('FEED_CACHE_TTL', 15))
+        
+        # Email configuration
+        MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+        MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
+        MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
+        MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+        MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+        MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', MAIL_USERNAME)
+        MAIL_ENABLED = os.environ.get('MAIL_ENABLED', 'False').lower() == 'true'
+        
+        # Notification outbox
+        NOTIFY_ASYNC = os.environ.get('NOTIFY_ASYNC', 'True').lower() == 'true'
+        NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 500))
+        NOTIFY_FLUSH_INTERVAL = float(os.environ.get('NOTIFY_FLUSH_INTERVAL', 2.0))
+        NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', 10000))
+        # Seconds before a polling cursor that are re-read to catch late commits
+        NOTIFY_POLL_OVERLAP = int(os.environ.get('NOTIFY_POLL_OVERLAP', 30))
+        
+        # Opt-in instrumentation: request/SQL/hashing/processing metrics in the
+        # Prometheus text format at METRICS_PATH (optionally behind a bearer
+        # METRICS_TOKEN), and folded stacks of requests slower than
+        # PROFILE_THRESHOLD_MS written to PROFILE_DIR
+        INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'False').lower() == 'true'
+        METRICS_PATH = os.environ.get('METRICS_PATH', '/metrics')
+        METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+        N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+        PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', 'False').lower() == 'true'
+        PROFILE_THRESHOLD_MS = int(os.environ.get('PROFILE_THRESHOLD_MS', 500))
+        PROFILE_INTERVAL_MS = int(os.environ.get('PROFILE_INTERVAL_MS', 5))
+        PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+    return Config
@@ -1,34 +1,46 @@
 import os
 import sys
-from dotenv import load_dotenv
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
-from models import User
-
-load_dotenv()
+from models import db, User
+from validation import normalize_phone
 
 def create_admin_user():
-    with app.app_context():
-        # Check if admin already exists
-        admin = User.query.filter_by(username=os.environ.get('ADMIN_USERNAME', 'admin')).first()
-        if admin:
-            print("Admin user already exists")
-            return
-        
-        admin = User(
-            username=os.environ.get('ADMIN_USERNAME', 'admin'),
-            email=os.environ.get('ADMIN_EMAIL', 'admin@kapcha.com'),
-            phone=os.environ.get('ADMIN_PHONE', '+1234567890'),
-            role='admin'
-        )
-        admin.set_password(os.environ.get('ADMIN_PASSWORD', 'admin123'))
-        
-        db.session.add(admin)
-        db.session.commit()
-        print("Admin user created successfully")
+    """Create the admin account; expects an application context."""
+    # Check if admin already exists
+    admin = User.query.filter_by(username=os.environ.get('ADMIN_USERNAME', 'admin')).first()
+    if admin:
+        print("Admin user already exists")
+        return
+    
+    # Stored in E.164 like every other user, so exports re-import cleanly
+    phone = os.environ.get('ADMIN_PHONE', '+14155550100')
+    normalized = normalize_phone(phone)
+    if normalized is None:
+        raise ValueError(f"ADMIN_PHONE {phone!r} is not a valid phone number")
+
+    admin = User(
+        username=os.environ.get('ADMIN_USERNAME', 'admin'),
+        email=os.environ.get('ADMIN_EMAIL', 'admin@kapcha.com'),
+        phone=normalized,
+        role='admin'
+    )
+    admin.set_password(os.environ.get('ADMIN_PASSWORD', 'admin123'))
+    
+    db.session.add(admin)
+    db.session.commit()
+    print("Admin user created successfully")
 
 if __name__ == '__main__':
-    create_admin_user()
\ No newline at end of file
+    from dotenv import load_dotenv
+    from app import create_app
+
+    load_dotenv()
+
+    with create_app().app_context():
+        try:
+            create_admin_user()
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
@@ -0,0 +1,89 @@
+from flask import current_app
+from flask.globals import app_ctx
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from models import db
+
+REPLICA_BIND = 'replica'
+
+def engine_options(uri, config):
+    """Engine options for `uri`, tuned for the backend it points at."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        # The driver's timeout is SQLite's busy handler: writers wait for
+        # the lock instead of failing with "database is locked"
+        return {'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT', 5000) / 1000}}
+
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT', 5000))}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    ]
+    if config.get('SQLITE_WAL', True):
+        # WAL lets readers run alongside the single writer; NORMAL only
+        # syncs at checkpoints, which is still safe against corruption
+        pragmas[:0] = ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL']
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return on_connect
+
+def init_database(app):
+    """Configure engines and register db on `app`.
+
+    Must be called instead of db.init_app(). Engine options are derived
+    from the URI unless SQLALCHEMY_ENGINE_OPTIONS sets them explicitly.
+    If SQLALCHEMY_REPLICA_URI is set, it is added as the `replica` bind
+    and read_session() routes to it.
+    """
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config['SQLALCHEMY_DATABASE_URI'], config),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+
+    replica_uri = config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = {'url': replica_uri, **engine_options(replica_uri, config)}
+        config['SQLALCHEMY_BINDS'] = binds
+
+    db.init_app(app)
+
+    # Engines exist after init_app but have not connected yet
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _sqlite_pragmas(config))
+
+        if replica_uri:
+            session = scoped_session(
+                sessionmaker(bind=db.engines[REPLICA_BIND]),
+                scopefunc=lambda: id(app_ctx._get_current_object())
+            )
+            app.extensions['read_session'] = session
+            app.teardown_appcontext(lambda exc: session.remove())
+
+def read_session():
+    """Session for read-only queries that can tolerate replica lag.
+
+    Returns the replica session when one is configured, otherwise the
+    primary db.session. Anything that must see the request's own writes
+    should keep using db.session.
+    """
+    return current_app.extensions.get('read_session', db.session)
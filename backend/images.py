@@ -0,0 +1,373 @@
+import math
+import os
+
+from flask import jsonify, request
+from flask_jwt_extended import jwt_required, verify_jwt_in_request, get_jwt_identity
+from sqlalchemy import and_, or_, func, select, literal, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Blob, User, Image, Like, Comment, Notification, IMAGE_FAILED, IMAGE_PENDING, IMAGE_READY
+from auth import get_user_payload
+from cache import get_cache
+from database import read_session
+from ingest import sniff_image, UploadRejected
+from notifications import notify, _bump_unread_counts
+from processing import get_processing_pool, QueueFull
+from storage import get_blob_store, store_upload, acquire_blob, release_blob
+from utils import allowed_file, derivative_filename, encode_cursor, decode_cursor, DERIVATIVE_FORMATS
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 50
+
+def _current_user_id():
+    # The feed is public, so a missing or invalid token just means anonymous
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+def build_feed_query(limit, cursor=None, user_id=None, viewer_id=None):
+    """Select one feed page with counts and the viewer's like flag.
+
+    The page itself is resolved with a keyset predicate on
+    (created_at, id), so deep pages cost the same as the first one. Like
+    and comment counts come from the denormalized counters on Image and
+    the viewer's flag from an index probe on unique_like, which keeps the
+    whole page to a single round trip. The total is only counted for the
+    first page; counting scans every ready image, which cursor pages skip.
+    """
+    filters = [Image.status == IMAGE_READY]
+    if user_id:
+        filters.append(Image.user_id == user_id)
+
+    if cursor:
+        total = literal(None)
+    else:
+        total = select(func.count(Image.id)).where(*filters).scalar_subquery()
+
+    page_filters = list(filters)
+    if cursor:
+        created_at, image_id = cursor
+        page_filters.append(or_(
+            Image.created_at < created_at,
+            and_(Image.created_at == created_at, Image.id < image_id)
+        ))
+
+    if viewer_id:
+        user_has_liked = (
+            select(Like.id)
+            .where(Like.user_id == viewer_id, Like.image_id == Image.id)
+            .exists()
+        )
+    else:
+        user_has_liked = literal(False)
+
+    # Fetch one extra row to know whether another page exists
+    return (
+        select(
+            Image,
+            User.username,
+            Image.like_count.label('likes_count'),
+            Image.comment_count.label('comments_count'),
+            total.label('total'),
+            user_has_liked.label('user_has_liked'),
+        )
+        .join(User, User.id == Image.user_id)
+        .where(*page_filters)
+        .order_by(Image.created_at.desc(), Image.id.desc())
+        .limit(limit + 1)
+    )
+
+def image_urls(image):
+    """Per-size, per-format URLs for an image's derivatives."""
+    formats = [fmt for fmt, _, _, _ in DERIVATIVE_FORMATS]
+    if not image.derivatives:
+        # Processed before derivatives existed: every size is the one file
+        url = f"/uploads/{image.filename}"
+        return {size: {fmt: url for fmt in formats} for size in ('thumb', 'medium', 'full')}
+
+    return {
+        size: {
+            fmt: f"/uploads/{derivative_filename(image.filename, size, fmt)}"
+            for fmt in formats
+        }
+        for size in image.derivatives
+    }
+
+def serialize_image(row):
+    image = row.Image
+    return {
+        'id': image.id,
+        'filename': image.filename,
+        'original_filename': image.original_filename,
+        'caption': image.caption,
+        'created_at': image.created_at.isoformat() if image.created_at else None,
+        'urls': image_urls(image),
+        'user': {
+            'id': image.user_id,
+            'username': row.username
+        },
+        'likes_count': row.likes_count,
+        'comments_count': row.comments_count,
+        'user_has_liked': bool(row.user_has_liked)
+    }
+
+def feed_page(limit, cursor=None, user_id=None, viewer_id=None):
+    query = build_feed_query(limit, cursor=cursor, user_id=user_id, viewer_id=viewer_id)
+    rows = read_session().execute(query).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1].Image
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    # Cursor pages leave total/pages null; clients keep the first page's
+    total = None
+    if cursor is None:
+        total = rows[0].total if rows else 0
+    return {
+        'images': [serialize_image(row) for row in rows],
+        'total': total,
+        'pages': math.ceil(total / limit) if total is not None else None,
+        'next_cursor': next_cursor
+    }
+
+def _bump_counter(image_id, column, delta):
+    db.session.execute(
+        update(Image)
+        .where(Image.id == image_id)
+        .values({column: getattr(Image, column) + delta})
+    )
+
+def init_image_routes(app):
+
+    @app.route('/api/images', methods=['GET'])
+    def get_images():
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        cursor = None
+        if request.args.get('cursor'):
+            cursor = decode_cursor(request.args['cursor'])
+            if cursor is None:
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        user_id = request.args.get('user_id')
+        viewer_id = _current_user_id()
+
+        # The first page seen by anonymous visitors is identical for all of
+        # them, so it is served from the cache
+        if cursor is None and viewer_id is None:
+            cache = get_cache()
+            page = cache.get_or_set(
+                cache.feed_key(limit, user_id),
+                app.config.get('FEED_CACHE_TTL', 15),
+                lambda: feed_page(limit, user_id=user_id)
+            )
+        else:
+            page = feed_page(limit, cursor=cursor, user_id=user_id, viewer_id=viewer_id)
+
+        return jsonify(page), 200
+
+    @app.route('/api/images', methods=['POST'])
+    @jwt_required()
+    def upload_image():
+        file = request.files.get('image')
+
+        if not file or not file.filename:
+            return jsonify({'error': 'No image provided'}), 400
+
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Invalid file type'}), 400
+
+        # Header-only checks; nothing is decoded in the request thread
+        try:
+            sniff_image(file.stream, app.config.get('IMAGE_MAX_PIXELS', 40_000_000))
+        except UploadRejected as e:
+            return jsonify({'error': e.message}), e.status
+
+        # Reserve a processing slot before touching disk so a saturated
+        # pool rejects the upload as cheaply as possible
+        pool = get_processing_pool()
+        try:
+            pool.reserve()
+        except QueueFull:
+            return jsonify({'error': 'Upload queue is full, please retry shortly'}), 503, {'Retry-After': '5'}
+
+        try:
+            digest, filename, raw_path = store_upload(file)
+            blob, created = acquire_blob(digest, filename)
+
+            if blob.status == IMAGE_FAILED:
+                # The last attempt may have failed for reasons unrelated to
+                # the bytes (a killed worker, a full disk), so process them
+                # again; only the upload that flips the blob back retries
+                created = bool(db.session.execute(
+                    update(Blob)
+                    .where(Blob.hash == digest, Blob.status == IMAGE_FAILED)
+                    .values(status=IMAGE_PENDING)
+                ).rowcount)
+                blob = db.session.get(Blob, digest, populate_existing=True)
+
+            image = Image(
+                filename=blob.filename,
+                original_filename=file.filename,
+                caption=request.form.get('caption'),
+                user_id=get_jwt_identity(),
+                content_hash=digest,
+                status=blob.status,
+                derivatives=blob.derivatives
+            )
+            db.session.add(image)
+            db.session.commit()
+        except Exception:
+            pool.release()
+            raise
+
+        if not created:
+            # Same bytes were uploaded before: share the blob, skip processing
+            os.remove(raw_path)
+            pool.release()
+            if image.status == IMAGE_READY:
+                get_cache().invalidate_feed()
+            return jsonify({'id': image.id, 'status': image.status}), 201 if image.status == IMAGE_READY else 202
+
+        # From here the pool owns the slot: if no worker can take the upload,
+        # submit releases it, marks the rows failed and removes the raw file
+        pool.submit(digest, raw_path, get_blob_store().path(filename))
+
+        return jsonify({'id': image.id, 'status': image.status}), 202
+
+    @app.route('/api/images/<image_id>', methods=['DELETE'])
+    @jwt_required()
+    def delete_image(image_id):
+        image = db.session.get(Image, image_id)
+
+        if not image:
+            return jsonify({'error': 'Image not found'}), 404
+
+        user = get_user_payload(get_jwt_identity())
+        if image.user_id != get_jwt_identity() and (not user or user['role'] != 'admin'):
+            return jsonify({'error': 'Not allowed to delete this image'}), 403
+
+        # Files stay on disk while any other Image still references the blob;
+        # uploads from before content addressing own their files outright
+        orphan = image
+        if image.content_hash:
+            orphan = release_blob(image.content_hash)
+        orphan_files = (orphan.filename, orphan.derivatives) if orphan else None
+
+        # Unread notifications about the image vanish with it, so take them
+        # off their recipients' counters in the same transaction
+        unread = db.session.execute(
+            select(Notification.user_id, func.count(Notification.id))
+            .where(Notification.image_id == image.id, Notification.is_read.is_(False))
+            .group_by(Notification.user_id)
+        ).all()
+        Notification.query.filter_by(image_id=image.id).delete(synchronize_session=False)
+        if unread:
+            _bump_unread_counts({user_id: -count for user_id, count in unread})
+        db.session.delete(image)
+        db.session.commit()
+
+        get_cache().invalidate_feed()
+
+        if orphan_files:
+            get_blob_store().remove(*orphan_files)
+
+        return jsonify({'message': 'Image deleted'}), 200
+
+    @app.route('/api/images/<image_id>/status', methods=['GET'])
+    def get_image_status(image_id):
+        image = db.session.get(Image, image_id)
+
+        if not image:
+            return jsonify({'error': 'Image not found'}), 404
+
+        return jsonify({'id': image.id, 'status': image.status}), 200
+
+    @app.route('/api/images/<image_id>/like', methods=['POST'])
+    @jwt_required()
+    def like_image(image_id):
+        image = db.session.get(Image, image_id)
+        if not image:
+            return jsonify({'error': 'Image not found'}), 404
+        owner_id = image.user_id
+
+        # unique_like rejects duplicates, so only a successful insert bumps the counter
+        db.session.add(Like(user_id=get_jwt_identity(), image_id=image_id))
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'Image already liked'}), 400
+
+        _bump_counter(image_id, 'like_count', 1)
+        db.session.commit()
+        get_cache().invalidate_feed()
+        notify('like', owner_id, get_jwt_identity(), image_id)
+
+        return jsonify({'message': 'Image liked'}), 201
+
+    @app.route('/api/images/<image_id>/like', methods=['DELETE'])
+    @jwt_required()
+    def unlike_image(image_id):
+        deleted = Like.query.filter_by(
+            user_id=get_jwt_identity(), image_id=image_id
+        ).delete(synchronize_session=False)
+
+        if not deleted:
+            return jsonify({'error': 'Like not found'}), 404
+
+        _bump_counter(image_id, 'like_count', -1)
+        db.session.commit()
+        get_cache().invalidate_feed()
+
+        return jsonify({'message': 'Like removed'}), 200
+
+    @app.route('/api/images/<image_id>/comments', methods=['GET'])
+    def get_comments(image_id):
+        rows = read_session().execute(
+            select(Comment, User.username)
+            .join(User, User.id == Comment.user_id)
+            .where(Comment.image_id == image_id)
+            .order_by(Comment.created_at)
+        ).all()
+
+        return jsonify({
+            'comments': [{
+                'id': comment.id,
+                'content': comment.content,
+                'created_at': comment.created_at.isoformat() if comment.created_at else None,
+                'user': {
+                    'id': comment.user_id,
+                    'username': username
+                }
+            } for comment, username in rows]
+        }), 200
+
+    @app.route('/api/images/<image_id>/comments', methods=['POST'])
+    @jwt_required()
+    def add_comment(image_id):
+        data = request.get_json() or {}
+        content = (data.get('content') or '').strip()
+
+        if not content:
+            return jsonify({'error': 'Comment cannot be empty'}), 400
+
+        image = db.session.get(Image, image_id)
+        if not image:
+            return jsonify({'error': 'Image not found'}), 404
+        owner_id = image.user_id
+
+        comment = Comment(content=content, user_id=get_jwt_identity(), image_id=image_id)
+        db.session.add(comment)
+        _bump_counter(image_id, 'comment_count', 1)
+        db.session.commit()
+        get_cache().invalidate_feed()
+        notify('comment', owner_id, get_jwt_identity(), image_id, content[:200])
+
+        return jsonify({'message': 'Comment added', 'id': comment.id}), 201
@@ -0,0 +1,88 @@
+import hashlib
+import tempfile
+from flask import Request, current_app
+
+# Leading bytes of every format we accept
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+class UploadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class HashingSpooledFile:
+    """Spooled temp file that hashes everything written to it.
+
+    Werkzeug's form parser writes each uploaded file into the stream
+    returned by the request's stream factory in fixed-size chunks; this
+    keeps small uploads in memory, rolls large ones over to disk, and
+    computes the content hash in the same pass.
+    """
+
+    def __init__(self, max_size, dir=None):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b', dir=dir)
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+class IngestRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        return HashingSpooledFile(
+            max_size=config.get('INGEST_SPOOL_MAX_MEMORY', 1024 * 1024),
+            dir=config.get('INGEST_TMP_DIR')
+        )
+
+def sniff_image(stream, max_pixels):
+    """Validate an upload from its header alone and return (format, size).
+
+    Checks the magic bytes, then lets Pillow parse the header (which does
+    not decode pixel data) to enforce the pixel budget. The stream is
+    rewound afterwards.
+    """
+    stream.seek(0)
+    head = stream.read(16)
+    stream.seek(0)
+
+    fmt = next((name for magic, name in MAGIC_NUMBERS if head.startswith(magic)), None)
+    if fmt is None and head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        fmt = 'WEBP'
+    if fmt is None:
+        raise UploadRejected('Unsupported image format')
+
+    from PIL import Image as PILImage
+
+    try:
+        with PILImage.open(stream, formats=[fmt]) as image:
+            width, height = image.size
+    except (OSError, SyntaxError, PILImage.DecompressionBombError):
+        raise UploadRejected('Invalid image')
+    finally:
+        stream.seek(0)
+
+    if width * height > max_pixels:
+        raise UploadRejected(f"Image exceeds the {max_pixels} pixel limit", 413)
+
+    return fmt, (width, height)
+
+def init_ingest(app):
+    app.request_class = IngestRequest
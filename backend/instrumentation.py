@@ -0,0 +1,267 @@
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status.', None),
+    'db_queries_per_request': ('histogram', 'SQL statements executed per request.', COUNT_BUCKETS),
+    'db_query_duration_seconds': ('histogram', 'SQL statement execution time.', QUERY_BUCKETS),
+    'db_n_plus_one_total': ('counter', 'Requests that repeated one statement N_PLUS_ONE_THRESHOLD+ times.', None),
+    'image_processing_seconds': ('histogram', 'Pillow decode/resize/encode time per upload.', LATENCY_BUCKETS),
+    'image_processing_latency_seconds': ('histogram', 'Upload processing time including queueing.', LATENCY_BUCKETS),
+    'password_hash_seconds': ('histogram', 'Password hashing time by operation.', LATENCY_BUCKETS),
+    'slow_request_profiles_total': ('counter', 'Slow requests whose stacks were dumped.', None),
+}
+PREFIX = 'kapcha_'
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+def _labels(labels, extra=None):
+    items = sorted(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escape = lambda v: str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in items) + '}'
+
+class Metrics:
+    """In-process metrics registry rendered in the Prometheus text format.
+
+    Values are per process; with several server workers each one exposes
+    its own series and Prometheus aggregates them.
+    """
+
+    def __init__(self):
+        self._series = {name: {} for name in METRICS}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            if METRICS[name][0] == 'counter':
+                series[key] = series.get(key, 0) + value
+            else:
+                if key not in series:
+                    series[key] = Histogram(METRICS[name][2])
+                series[key].observe(value)
+
+    def render(self, gauges=()):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, _) in METRICS.items():
+                full = PREFIX + name
+                lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+                for key, value in sorted(self._series[name].items()):
+                    if kind == 'counter':
+                        lines.append(f"{full}{_labels(key)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{full}_bucket{_labels(key, ('le', le))} {cumulative}")
+                    lines.append(f"{full}_sum{_labels(key)} {value.sum}")
+                    lines.append(f"{full}_count{_labels(key)} {cumulative}")
+
+        for name, kind, help_text, samples in gauges:
+            full = PREFIX + name
+            lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+            lines += [f"{full}{_labels(labels.items())} {value}" for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+def get_metrics(app=None):
+    """The app's registry, or None when instrumentation is off."""
+    if app is None:
+        if not has_app_context():
+            return None
+        app = current_app
+    return app.extensions.get('metrics')
+
+def observe(name, value, app=None, **labels):
+    metrics = get_metrics(app)
+    if metrics is not None:
+        metrics.observe(name, value, **labels)
+
+def timed(fn, *args):
+    """Call fn(*args) and return (result, seconds). Picklable for process pools."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+class SlowRequestProfiler:
+    """Sampling profiler for in-flight requests.
+
+    A background thread samples the stack of every thread currently
+    serving a request each `interval` seconds. When a request takes
+    longer than `threshold` its samples are written to `directory` in
+    the folded format ("outer;inner count" per line) read by
+    flamegraph.pl, inferno and speedscope.
+    """
+
+    def __init__(self, interval, threshold, directory):
+        self.interval = interval
+        self.threshold = threshold
+        self.directory = directory
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+
+    def start_request(self):
+        with self._lock:
+            self._ensure_thread()
+            self._active[threading.get_ident()] = Counter()
+
+    def finish_request(self, endpoint, duration):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or duration < self.threshold:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}-{int(duration * 1000)}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+def _fold(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    observe('db_query_duration_seconds', elapsed)
+    if has_request_context() and 'instrumentation' in g:
+        g.instrumentation['queries'][statement] += 1
+        g.instrumentation['query_time'] += elapsed
+
+def _gauges(app):
+    from cache import get_cache
+
+    stats = get_cache(app).stats()
+    return [
+        ('cache_hits_total', 'counter', 'Cache hits by namespace.',
+         [({'namespace': ns}, counts['hits']) for ns, counts in sorted(stats.items())]),
+        ('cache_misses_total', 'counter', 'Cache misses by namespace.',
+         [({'namespace': ns}, counts['misses']) for ns, counts in sorted(stats.items())]),
+    ]
+
+def init_instrumentation(app):
+    """Opt-in request, SQL, hashing and image-processing metrics.
+
+    Enabled by INSTRUMENTATION_ENABLED. Adds a Server-Timing header to
+    every response, serves the metrics at METRICS_PATH and, with
+    PROFILE_SLOW_REQUESTS, dumps folded stacks of slow requests.
+    """
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+
+    metrics = app.extensions['metrics'] = Metrics()
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+    profiler = None
+    if app.config.get('PROFILE_SLOW_REQUESTS'):
+        profiler = SlowRequestProfiler(
+            interval=app.config.get('PROFILE_INTERVAL_MS', 5) / 1000,
+            threshold=app.config.get('PROFILE_THRESHOLD_MS', 500) / 1000,
+            directory=app.config.get('PROFILE_DIR', 'profiles')
+        )
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_timer():
+        g.instrumentation = {'start': time.perf_counter(), 'queries': Counter(), 'query_time': 0.0}
+        if profiler:
+            profiler.start_request()
+
+    @app.after_request
+    def record_request(response):
+        state = g.pop('instrumentation', None)
+        if state is None:
+            return response
+
+        duration = time.perf_counter() - state['start']
+        endpoint = request.endpoint or 'unmatched'
+        queries = state['queries']
+        metrics.observe('http_request_duration_seconds', duration, endpoint=endpoint)
+        metrics.observe('http_requests_total', 1, endpoint=endpoint, method=request.method,
+                        status=response.status_code)
+        metrics.observe('db_queries_per_request', sum(queries.values()), endpoint=endpoint)
+
+        if queries:
+            statement, repeats = queries.most_common(1)[0]
+            if repeats >= threshold:
+                metrics.observe('db_n_plus_one_total', 1, endpoint=endpoint)
+                app.logger.warning(
+                    f"Possible N+1 in {endpoint}: statement ran {repeats} times: {statement[:200]}"
+                )
+
+        if profiler:
+            path = profiler.finish_request(endpoint, duration)
+            if path:
+                metrics.observe('slow_request_profiles_total', 1, endpoint=endpoint)
+                app.logger.warning(f"Slow request {endpoint} took {duration * 1000:.0f}ms, stacks in {path}")
+
+        response.headers.add(
+            'Server-Timing',
+            f"app;dur={duration * 1000:.1f}, db;dur={state['query_time'] * 1000:.1f};desc=\"{sum(queries.values())} queries\""
+        )
+        return response
+
+    @app.route(app.config.get('METRICS_PATH', '/metrics'))
+    def metrics_endpoint():
+        token = app.config.get('METRICS_TOKEN')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(metrics.render(_gauges(app)), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,156 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from flask import abort, current_app, request, send_file, Response
+from werkzeug.security import safe_join
+
+class ByteLRU:
+    """Thread-safe LRU of byte strings bounded by their total size."""
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_item_bytes or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            self._items[key] = (nbytes, value)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self.size -= evicted
+
+class MediaServer:
+    """Serves /uploads with long-lived caching.
+
+    Upload filenames are unique and never rewritten, so responses are
+    marked immutable and carry a strong ETag derived from the file's
+    content hash. Small files are kept in memory; everything else is
+    either streamed by werkzeug (which handles Range and conditional
+    requests) or handed to the front-end server via X-Sendfile or
+    X-Accel-Redirect so the worker never streams the bytes itself.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+    MAX_ETAGS = 100000
+
+    def __init__(self, config):
+        self.folder = config['UPLOAD_FOLDER']
+        self.offload = config.get('MEDIA_OFFLOAD') or None
+        self.accel_prefix = config.get('MEDIA_ACCEL_PREFIX', '/_protected_uploads/')
+        self.max_age = config.get('MEDIA_MAX_AGE', 31536000)
+        self.cache = ByteLRU(
+            config.get('MEDIA_CACHE_BYTES', 64 * 1024 * 1024),
+            config.get('MEDIA_CACHE_MAX_ITEM_BYTES', 256 * 1024)
+        )
+        self._etags = OrderedDict()
+        self._etags_lock = threading.Lock()
+
+    def _hash_file(self, path, stat):
+        # Memoized by (mtime, size) so a file is hashed once per process
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._etags_lock:
+            cached = self._etags.get(path)
+            if cached and cached[0] == key:
+                self._etags.move_to_end(path)
+                return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        etag = digest.hexdigest()[:32]
+
+        with self._etags_lock:
+            self._etags[path] = (key, etag)
+            if len(self._etags) > self.MAX_ETAGS:
+                self._etags.popitem(last=False)
+        return etag
+
+    def _load(self, path, stat):
+        """Return (etag, data); data is None for files too big to cache."""
+        cache_key = (path, stat.st_mtime_ns)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if stat.st_size <= self.cache.max_item_bytes:
+            with open(path, 'rb') as f:
+                data = f.read()
+            entry = (hashlib.sha256(data).hexdigest()[:32], data)
+            self.cache.put(cache_key, entry, len(data))
+            return entry
+
+        return self._hash_file(path, stat), None
+
+    def _cache_headers(self, response, etag):
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+        return response
+
+    def send(self, filename):
+        path = safe_join(self.folder, filename)
+        if path is None:
+            abort(404)
+        path = os.path.abspath(path)
+
+        # Raw uploads are private until processed. Checked on the normalized
+        # path, since safe_join lets 'x/../raw/...' through
+        filename = os.path.relpath(path, os.path.abspath(self.folder)).replace(os.sep, '/')
+        if filename.split('/', 1)[0] == 'raw':
+            abort(404)
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            abort(404)
+
+        etag, data = self._load(path, stat)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if request.if_none_match.contains(etag):
+            return self._cache_headers(Response(status=304), etag)
+
+        if data is not None:
+            # Headers first so make_conditional can honour If-Range
+            response = self._cache_headers(Response(data, mimetype=mimetype), etag)
+            return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+        if self.offload == 'x-accel-redirect':
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = self.accel_prefix + filename
+        elif self.offload == 'x-sendfile':
+            response = Response(mimetype=mimetype)
+            response.headers['X-Sendfile'] = path
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=True, etag=etag, max_age=self.max_age)
+
+        return self._cache_headers(response, etag)
+
+def get_media_server(app=None):
+    app = app or current_app._get_current_object()
+    server = app.extensions.get('media')
+    if server is None:
+        server = app.extensions.setdefault('media', MediaServer(app.config))
+    return server
+
+def send_upload(filename):
+    return get_media_server().send(filename)
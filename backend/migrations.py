@@ -0,0 +1,123 @@
+from datetime import datetime
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Image, Blob
+
+# Each revision is applied once, in order, and recorded in schema_revision.
+# Revisions must be safe to run against a database created by an older
+# db.create_all(), i.e. they add what is missing instead of assuming a
+# blank schema.
+
+def _add_missing_columns(conn, model, names):
+    table = model.__table__
+    existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{name}" {column.type.compile(conn.dialect)}'
+        if column.server_default is not None:
+            ddl += f" NOT NULL DEFAULT '{column.server_default.arg}'"
+        conn.execute(text(ddl))
+
+def _create_missing_indexes(conn, names):
+    indexes = {
+        index.name: index
+        for table in db.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+def _initial(conn):
+    db.metadata.create_all(conn)
+
+def _feed_indexes_and_counters(conn):
+    from repair_counters import recompute_counters
+
+    _add_missing_columns(conn, Image, ['like_count', 'comment_count'])
+    _create_missing_indexes(conn, [
+        'ix_image_created_at_id',
+        'ix_image_user_id_created_at',
+        'ix_like_image_id',
+        'ix_comment_image_id_created_at',
+        'ix_notification_user_id_is_read_created_at',
+    ])
+    recompute_counters(conn)
+
+def _image_processing_status(conn):
+    # Rows that predate the pipeline were processed inline, so they are ready
+    _add_missing_columns(conn, Image, ['status'])
+
+def _image_derivatives(conn):
+    # Older images have no derivatives and are served from their filename
+    _add_missing_columns(conn, Image, ['derivatives'])
+
+def _content_addressed_blobs(conn):
+    # Pre-existing images keep their flat filenames and own their files
+    Blob.__table__.create(conn, checkfirst=True)
+    _add_missing_columns(conn, Image, ['content_hash'])
+    _create_missing_indexes(conn, ['ix_image_content_hash'])
+
+def _unread_notification_counter(conn):
+    from repair_counters import recompute_unread_counts
+
+    _add_missing_columns(conn, User, ['unread_count'])
+    recompute_unread_counts(conn)
+
+def _normalize_phones(conn):
+    # Rewrite stored phones as E.164. Rows whose number cannot be parsed,
+    # or whose normalized form belongs to another user, are left alone.
+    from validation import PhoneValidator
+
+    validator = PhoneValidator()
+    users = User.__table__
+    for user_id, phone in conn.execute(select(users.c.id, users.c.phone)).all():
+        normalized = validator.normalize(phone)
+        if not normalized or normalized == phone:
+            continue
+        try:
+            with conn.begin_nested():
+                conn.execute(update(users).where(users.c.id == user_id).values(phone=normalized))
+        except IntegrityError:
+            pass
+
+def _notification_inbox_index(conn):
+    # The unread index cannot serve the unfiltered inbox ordering
+    _create_missing_indexes(conn, ['ix_notification_user_id_created_at_id'])
+
+REVISIONS = [
+    ('0001_initial', _initial),
+    ('0002_feed_indexes_and_counters', _feed_indexes_and_counters),
+    ('0003_image_processing_status', _image_processing_status),
+    ('0004_image_derivatives', _image_derivatives),
+    ('0005_content_addressed_blobs', _content_addressed_blobs),
+    ('0006_unread_notification_counter', _unread_notification_counter),
+    ('0007_normalize_phones', _normalize_phones),
+    ('0008_notification_inbox_index', _notification_inbox_index),
+]
+
+def _applied_revisions(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_revision ('
+        'revision VARCHAR(64) PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+    ))
+    return {row[0] for row in conn.execute(text('SELECT revision FROM schema_revision'))}
+
+def upgrade(engine=None):
+    """Apply pending revisions and return the ids that were applied."""
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as conn:
+        done = _applied_revisions(conn)
+    for revision, apply in REVISIONS:
+        if revision in done:
+            continue
+        with engine.begin() as conn:
+            apply(conn)
+            conn.execute(
+                text('INSERT INTO schema_revision (revision, applied_at) VALUES (:r, :t)'),
+                {'r': revision, 't': datetime.utcnow()}
+            )
+        applied.append(revision)
+    return applied
@@ -1,10 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import datetime
 import uuid
 
 db = SQLAlchemy()
 
+# Image processing states
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+
 class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -15,13 +20,18 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Maintained by the notification dispatcher and mark-read endpoint
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     images = db.relationship('Image', backref='user', lazy=True)
     likes = db.relationship('Like', backref='user', lazy=True)
     comments = db.relationship('Comment', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Same method and hashing pool as registration
+        from passwords import get_hasher
+        self.password_hash = get_hasher().hash(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -33,10 +43,33 @@ class Image(db.Model):
     caption = db.Column(db.Text)
     user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default=IMAGE_PENDING, server_default=IMAGE_READY)
+    derivatives = db.Column(db.JSON)  # {size: [width, height]}, see utils.DERIVATIVE_SIZES
+    content_hash = db.Column(db.String(64))  # Blob.hash, NULL for pre-dedup uploads
+    
+    # Denormalized counters, maintained by the like/comment write paths
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     likes = db.relationship('Like', backref='image', lazy=True, cascade='all, delete-orphan')
     comments = db.relationship('Comment', backref='image', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_image_created_at_id', 'created_at', 'id'),  # feed
+        db.Index('ix_image_user_id_created_at', 'user_id', 'created_at'),  # profile
+        db.Index('ix_image_content_hash', 'content_hash'),
+    )
+
+class Blob(db.Model):
+    # One row per distinct uploaded content, shared by every Image with the
+    # same bytes; files are removed when ref_count drops to zero
+    hash = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=IMAGE_PENDING)
+    derivatives = db.Column(db.JSON)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Like(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -44,7 +77,10 @@ class Like(db.Model):
     image_id = db.Column(db.String(36), db.ForeignKey('image.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'image_id', name='unique_like'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'image_id', name='unique_like'),
+        db.Index('ix_like_image_id', 'image_id'),
+    )
 
 class Comment(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -52,6 +88,10 @@ class Comment(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
     image_id = db.Column(db.String(36), db.ForeignKey('image.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_comment_image_id_created_at', 'image_id', 'created_at'),  # comment thread
+    )
 
 class Notification(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
@@ -61,4 +101,9 @@ class Notification(db.Model):
     image_id = db.Column(db.String(36), db.ForeignKey('image.id'))
     message = db.Column(db.Text)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_notification_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),  # unread inbox
+        db.Index('ix_notification_user_id_created_at_id', 'user_id', 'created_at', 'id'),  # full inbox
+    )
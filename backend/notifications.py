@@ -0,0 +1,421 @@
+import atexit
+import os
+import queue
+import smtplib
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from email.message import EmailMessage
+from flask import current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import and_, bindparam, case, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from models import db, Image, Notification, User
+from utils import encode_cursor, decode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_MARK_IDS = 500
+
+_dispatcher_lock = threading.Lock()
+
+class Mailer:
+    """Sends a batch of messages over a single SMTP connection."""
+
+    def __init__(self, config):
+        self.host = config.get('MAIL_SERVER', 'localhost')
+        self.port = config.get('MAIL_PORT', 25)
+        self.use_tls = config.get('MAIL_USE_TLS', False)
+        self.username = config.get('MAIL_USERNAME')
+        self.password = config.get('MAIL_PASSWORD')
+        self.sender = config.get('MAIL_DEFAULT_SENDER') or self.username or 'noreply@kapcha.local'
+        self.timeout = config.get('MAIL_TIMEOUT', 10)
+
+    def send_batch(self, messages):
+        if not messages:
+            return 0
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                message['From'] = self.sender
+                smtp.send_message(message)
+        return len(messages)
+
+def build_notification_email(to, notification_type, source_usernames, count):
+    """One email for a coalesced group of events on the same image."""
+    actor = source_usernames[0]
+    if count > 1:
+        actor = f"{actor} and {count - 1} other{'s' if count > 2 else ''}"
+    action = 'liked' if notification_type == 'like' else 'commented on'
+
+    message = EmailMessage()
+    message['To'] = to
+    message['Subject'] = f"{actor} {action} your photo"
+    message.set_content(f"{actor} {action} your photo on Kapcha.")
+    return message
+
+def _bump_unread_counts(counts):
+    # One executemany for the whole batch instead of a recount per recipient
+    users = User.__table__
+    new_count = users.c.unread_count + bindparam('delta')
+    db.session.connection().execute(
+        update(users)
+        .where(users.c.id == bindparam('recipient'))
+        .values(unread_count=case((new_count < 0, 0), else_=new_count)),
+        [{'recipient': user_id, 'delta': delta} for user_id, delta in counts.items()]
+    )
+
+def _live_events(events):
+    # Drop events whose image or users no longer exist
+    image_ids = {event['image_id'] for event in events if event['image_id']}
+    user_ids = {event['user_id'] for event in events}
+    user_ids.update(event['source_user_id'] for event in events if event['source_user_id'])
+
+    images = set()
+    if image_ids:
+        images = set(db.session.execute(select(Image.id).where(Image.id.in_(image_ids))).scalars())
+    users = set(db.session.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+    return [
+        event for event in events
+        if event['user_id'] in users
+        and (not event['source_user_id'] or event['source_user_id'] in users)
+        and (not event['image_id'] or event['image_id'] in images)
+    ]
+
+class NotificationDispatcher:
+    """Outbox for like/comment notifications.
+
+    Request handlers only enqueue events. A background thread drains the
+    queue in batches, bulk-inserts the Notification rows in one statement
+    and, if mail is enabled, coalesces events per (recipient, image, type)
+    into a single email, delivering the whole batch over one SMTP
+    connection. The queue is in memory: events still queued when a worker
+    dies are lost, which is acceptable for notifications.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.batch_size = app.config.get('NOTIFY_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('NOTIFY_FLUSH_INTERVAL', 2.0)
+        self.mail_enabled = app.config.get('MAIL_ENABLED', False)
+        self.mailer = Mailer(app.config)
+        self._queue = queue.Queue(maxsize=app.config.get('NOTIFY_QUEUE_SIZE', 10000))
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def enqueue(self, notification_type, user_id, source_user_id, image_id=None, message=None):
+        # Nobody needs to hear about their own likes and comments
+        if user_id == source_user_id:
+            return
+
+        event = {
+            'user_id': user_id,
+            'type': notification_type,
+            'source_user_id': source_user_id,
+            'image_id': image_id,
+            'message': message,
+        }
+
+        if not self.app.config.get('NOTIFY_ASYNC', True):
+            self.deliver([event])
+            return
+
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.app.logger.warning('Notification queue full, dropping event')
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def _next_batch(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        # Give a burst a moment to accumulate so it can be coalesced
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch(timeout=0.5)
+            if batch:
+                self.deliver(batch)
+
+    def flush(self):
+        """Deliver everything queued so far on the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self.deliver(batch)
+
+    def stop(self):
+        self._stopping.set()
+        self.flush()
+
+    def deliver(self, events):
+        if not events:
+            return
+
+        with self.app.app_context():
+            try:
+                events = self._store(events)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Failed to store {len(events)} notifications: {e}")
+                return
+
+            if self.mail_enabled and events:
+                try:
+                    self.mailer.send_batch(self._compose_emails(events))
+                except Exception as e:
+                    self.app.logger.error(f"Failed to send notification emails: {e}")
+
+    def _store(self, events):
+        """Insert the events' rows and bump unread counters in one commit.
+
+        Events whose image or users were deleted while queued are dropped
+        so they cannot fail the batch's foreign keys. Rows that still
+        fail (deleted after the check) are skipped one by one. Returns
+        the events that were stored.
+        """
+        events = _live_events(events)
+        if not events:
+            return []
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Notification), events)
+        except IntegrityError:
+            stored = []
+            for event in events:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(Notification), [event])
+                    stored.append(event)
+                except IntegrityError:
+                    self.app.logger.warning(f"Dropping notification for deleted rows: {event}")
+            events = stored
+
+        if events:
+            _bump_unread_counts(Counter(event['user_id'] for event in events))
+        db.session.commit()
+        return events
+
+    def _compose_emails(self, events):
+        groups = OrderedDict()
+        for event in events:
+            key = (event['user_id'], event['image_id'], event['type'])
+            groups.setdefault(key, []).append(event['source_user_id'])
+
+        user_ids = {user_id for user_id, _, _ in groups}
+        for sources in groups.values():
+            user_ids.update(sources)
+        users = {
+            row.id: row
+            for row in db.session.execute(
+                select(User.id, User.email, User.username).where(User.id.in_(user_ids))
+            )
+        }
+
+        messages = []
+        for (user_id, _, notification_type), sources in groups.items():
+            recipient = users.get(user_id)
+            if recipient is None:
+                continue
+            usernames = list(OrderedDict.fromkeys(
+                users[source].username for source in sources if source in users
+            ))
+            if not usernames:
+                continue
+            messages.append(build_notification_email(
+                recipient.email, notification_type, usernames, len(usernames)
+            ))
+        return messages
+
+def get_dispatcher(app=None):
+    app = app or current_app._get_current_object()
+    with _dispatcher_lock:
+        dispatcher = app.extensions.get('notifications')
+        if dispatcher is None:
+            dispatcher = NotificationDispatcher(app)
+            app.extensions['notifications'] = dispatcher
+        return dispatcher
+
+def notify(notification_type, user_id, source_user_id, image_id=None, message=None):
+    get_dispatcher().enqueue(notification_type, user_id, source_user_id, image_id, message)
+
+def _keyset_after(cursor):
+    created_at, row_id = cursor
+    return or_(
+        Notification.created_at > created_at,
+        and_(Notification.created_at == created_at, Notification.id > row_id)
+    )
+
+def _keyset_before(cursor):
+    created_at, row_id = cursor
+    return or_(
+        Notification.created_at < created_at,
+        and_(Notification.created_at == created_at, Notification.id < row_id)
+    )
+
+def serialize_notification(notification, source_username):
+    return {
+        'id': notification.id,
+        'type': notification.type,
+        'image_id': notification.image_id,
+        'message': notification.message,
+        'is_read': bool(notification.is_read),
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+        'source_user': {
+            'id': notification.source_user_id,
+            'username': source_username
+        } if notification.source_user_id else None
+    }
+
+def _unread_count(user_id):
+    return db.session.execute(
+        select(User.unread_count).where(User.id == user_id)
+    ).scalar() or 0
+
+def init_notification_routes(app):
+
+    @app.route('/api/notifications', methods=['GET'])
+    @jwt_required()
+    def get_notifications():
+        """Inbox listing, newest first.
+
+        `cursor` pages backwards through older items. `since` is for
+        polling with a previously returned `latest` cursor. created_at is
+        stamped before the row commits, possibly by another worker, so a
+        row can become visible with a timestamp older than `latest`;
+        `since` therefore re-reads NOTIFY_POLL_OVERLAP seconds before the
+        cursor and clients drop ids they already have. Listings walk the
+        (user_id, created_at, id) index, or (user_id, is_read, created_at)
+        with `unread`, instead of OFFSET, and the unread count is read
+        from the counter on the user row rather than recounted.
+        """
+        user_id = get_jwt_identity()
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        filters = [Notification.user_id == user_id]
+        if request.args.get('unread'):
+            filters.append(Notification.is_read.is_(False))
+
+        for param in ('cursor', 'since'):
+            if request.args.get(param):
+                cursor = decode_cursor(request.args[param])
+                if cursor is None:
+                    return jsonify({'error': f"Invalid {param}"}), 400
+                if param == 'cursor':
+                    filters.append(_keyset_before(cursor))
+                else:
+                    overlap = timedelta(seconds=current_app.config.get('NOTIFY_POLL_OVERLAP', 30))
+                    filters.append(Notification.created_at > cursor[0] - overlap)
+
+        source = aliased(User)
+        rows = db.session.execute(
+            select(Notification, source.username)
+            .outerjoin(source, source.id == Notification.source_user_id)
+            .where(*filters)
+            .order_by(Notification.created_at.desc(), Notification.id.desc())
+            .limit(limit + 1)
+        ).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = None
+        if has_more:
+            last = rows[-1].Notification
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        # Polling clients pass this back as `since`
+        latest = request.args.get('since')
+        if rows:
+            first = rows[0].Notification
+            latest = encode_cursor(first.created_at, first.id)
+
+        return jsonify({
+            'notifications': [serialize_notification(n, username) for n, username in rows],
+            'unread_count': _unread_count(user_id),
+            'next_cursor': next_cursor,
+            'latest': latest
+        }), 200
+
+    @app.route('/api/notifications/unread_count', methods=['GET'])
+    @jwt_required()
+    def get_unread_count():
+        return jsonify({'unread_count': _unread_count(get_jwt_identity())}), 200
+
+    @app.route('/api/notifications/read', methods=['POST'])
+    @jwt_required()
+    def mark_notifications_read():
+        """Mark a range of notifications read in one UPDATE.
+
+        `up_to` (inclusive) and optional `after` (exclusive) are cursors
+        bounding the range; `ids` marks an explicit list instead.
+        """
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object'}), 400
+
+        filters = [Notification.user_id == user_id, Notification.is_read.is_(False)]
+        if 'ids' in data:
+            ids = data['ids']
+            if (not isinstance(ids, list) or not ids or len(ids) > MAX_MARK_IDS
+                    or not all(isinstance(i, str) for i in ids)):
+                return jsonify({'error': f"ids must be a list of 1 to {MAX_MARK_IDS} notification ids"}), 400
+            filters.append(Notification.id.in_(ids))
+        elif data.get('up_to'):
+            up_to = decode_cursor(data['up_to'])
+            if up_to is None:
+                return jsonify({'error': 'Invalid up_to'}), 400
+            filters.append(or_(_keyset_before(up_to), and_(
+                Notification.created_at == up_to[0], Notification.id == up_to[1]
+            )))
+            if data.get('after'):
+                after = decode_cursor(data['after'])
+                if after is None:
+                    return jsonify({'error': 'Invalid after'}), 400
+                filters.append(_keyset_after(after))
+        else:
+            return jsonify({'error': 'Provide ids or up_to'}), 400
+
+        marked = db.session.execute(
+            update(Notification).where(*filters).values(is_read=True),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if marked:
+            _bump_unread_counts({user_id: -marked})
+        db.session.commit()
+
+        return jsonify({'marked': marked, 'unread_count': _unread_count(user_id)}), 200
@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from instrumentation import observe, timed
+
+# Fits User.password_hash (String(128)); werkzeug's scrypt default does not
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+
+_pool_lock = threading.Lock()
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing queue is full and the request should be shed."""
+
+class PasswordHasher:
+    """Runs password hashing on a small dedicated thread pool.
+
+    PBKDF2 and scrypt release the GIL inside hashlib, so a few threads
+    are enough to use the available cores while capping how much CPU
+    hashing can take from the rest of the app. At most `workers +
+    queue_depth` hashes may be pending; beyond that callers get
+    HashingOverloaded immediately instead of piling up behind a login
+    storm.
+    """
+
+    def __init__(self, workers, queue_depth, method, timeout=30):
+        self.method = method
+        self.timeout = timeout
+        # Werkzeug fills in missing parts of the method (pbkdf2:sha256 is
+        # stored as pbkdf2:sha256:600000), so compare against a real hash
+        self.prefix = generate_password_hash('probe', method).split('$', 1)[0]
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingOverloaded()
+        try:
+            future = self._executor.submit(timed, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        result, seconds = future.result(timeout=self.timeout)
+        observe('password_hash_seconds', seconds, operation=operation)
+        return result
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # Werkzeug hashes are "method$salt$hash"; the method carries the
+        # algorithm and its work factor
+        return password_hash.split('$', 1)[0] != self.prefix
+
+def get_hasher(app=None):
+    app = app or current_app._get_current_object()
+    with _pool_lock:
+        hasher = app.extensions.get('password_hasher')
+        if hasher is None:
+            hasher = PasswordHasher(
+                workers=app.config.get('HASH_WORKERS', 2),
+                queue_depth=app.config.get('HASH_QUEUE_DEPTH', 16),
+                method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+            )
+            app.extensions['password_hasher'] = hasher
+        return hasher
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from sqlalchemy import update
+from cache import get_cache
+from instrumentation import observe, timed
+from models import db, Blob, Image, IMAGE_READY, IMAGE_FAILED
+from storage import get_blob_store
+from utils import process_image
+
+_pool_lock = threading.Lock()
+
+class QueueFull(Exception):
+    """Raised when every processing slot is taken."""
+
+class ImageProcessingPool:
+    """Bounded process pool that turns raw uploads into published images.
+
+    Pillow decoding and resizing is CPU-bound, so it runs in worker
+    processes instead of request threads. At most `workers + queue_size`
+    uploads may be in flight; callers reserve a slot before persisting an
+    upload and get QueueFull when the pool is saturated.
+
+    Workers are started with `mp_context` rather than forked from the
+    (threaded) server process. A pool broken by a dying worker is
+    replaced on the next submit.
+    """
+
+    def __init__(self, app, workers, queue_size, max_pixels=None, mp_context=None):
+        self.app = app
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self.mp_context = mp_context
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created lazily, and again after a fork, so every server worker
+        # process owns its own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                context = multiprocessing.get_context(self.mp_context) if self.mp_context else None
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def reserve(self):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull()
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, digest, raw_path, filepath):
+        """Process a previously reserved upload.
+
+        On completion the blob and every Image row sharing its content
+        hash are marked ready (with their derivatives) or failed.
+        """
+        submitted = time.perf_counter()
+        if self.workers == 0:
+            # Inline mode for tests and CLI tools
+            future = Future()
+            try:
+                future.set_result(timed(process_image, raw_path, filepath, self.max_pixels))
+            except Exception as e:
+                future.set_exception(e)
+            self._finish(digest, raw_path, future, submitted)
+            return future
+
+        future = None
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(timed, process_image, raw_path, filepath, self.max_pixels)
+                break
+            except BrokenProcessPool as e:
+                # A worker died and took the pool with it: replace it and retry once
+                self._discard_executor(executor)
+                error = e
+            except Exception as e:
+                error = e
+                break
+
+        if future is None:
+            # Never reached a worker: fail the upload now so its slot and
+            # raw file are not leaked and its rows do not stay pending
+            future = Future()
+            future.set_exception(error)
+            self._finish(digest, raw_path, future, submitted)
+            return future
+
+        future.add_done_callback(lambda done: self._finish(digest, raw_path, done, submitted, executor))
+        return future
+
+    def _finish(self, digest, raw_path, future, submitted, executor=None):
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool) and executor is not None:
+                self._discard_executor(executor)
+            if error is None:
+                derivatives, seconds = future.result()
+                values = {'status': IMAGE_READY, 'derivatives': derivatives}
+                observe('image_processing_seconds', seconds, app=self.app)
+                observe('image_processing_latency_seconds', time.perf_counter() - submitted, app=self.app)
+            else:
+                self.app.logger.error(f"Error processing image {digest}: {error}")
+                values = {'status': IMAGE_FAILED}
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+
+            with self.app.app_context():
+                updated = db.session.execute(update(Blob).where(Blob.hash == digest).values(**values)).rowcount
+                db.session.execute(update(Image).where(Image.content_hash == digest).values(**values))
+                db.session.commit()
+                if error is None and not updated:
+                    # Every image using the blob was deleted while it was
+                    # processed, so nothing references the files just written
+                    store = get_blob_store(self.app)
+                    store.remove(store.blob_name(digest, '.jpg'), values['derivatives'])
+                elif error is None:
+                    get_cache(self.app).invalidate_feed()
+        finally:
+            self.release()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+def get_processing_pool(app=None):
+    app = app or current_app._get_current_object()
+    with _pool_lock:
+        pool = app.extensions.get('image_processing')
+        if pool is None:
+            pool = ImageProcessingPool(
+                app,
+                workers=app.config.get('IMAGE_WORKERS', 2),
+                queue_size=app.config.get('IMAGE_QUEUE_SIZE', 32),
+                max_pixels=app.config.get('IMAGE_MAX_PIXELS'),
+                mp_context=app.config.get('IMAGE_MP_CONTEXT')
+            )
+            app.extensions['image_processing'] = pool
+        return pool
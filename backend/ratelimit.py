@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import deque
+from flask import current_app
+
+class SlidingWindowLimiter:
+    """In-memory sliding-window rate limiter.
+
+    Keeps the timestamps of recent hits per key and allows a hit when
+    fewer than `limit` fall inside the window. State is per process, so
+    the effective limit scales with the number of server workers.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Record a hit; return 0 if allowed, else seconds until retry."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.max_keys:
+                    self._evict(now, window)
+                hits = self._hits[key] = deque()
+
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+
+            if len(hits) >= limit:
+                return max(1, int(hits[0] + window - now) + 1)
+
+            hits.append(now)
+            return 0
+
+    def _evict(self, now, window):
+        # Drop keys with no recent hits, then the oldest ones if still full
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - window]:
+            del self._hits[key]
+        while len(self._hits) >= self.max_keys:
+            del self._hits[next(iter(self._hits))]
+
+def get_limiter(app=None):
+    app = app or current_app._get_current_object()
+    limiter = app.extensions.get('rate_limiter')
+    if limiter is None:
+        limiter = app.extensions.setdefault('rate_limiter', SlidingWindowLimiter())
+    return limiter
+
+def check_rate_limits(*rules):
+    """Apply (key, limit, window) rules; return the longest retry-after, or 0."""
+    limiter = get_limiter()
+    return max((limiter.hit(key, limit, window) for key, limit, window in rules), default=0)
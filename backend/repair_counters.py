@@ -0,0 +1,105 @@
+import os
+import sys
+from sqlalchemy import exists, func, insert, select, update
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models import db, User, Image, Like, Comment, Notification, Blob
+
+def recompute_counters(conn):
+    """Recompute Image.like_count/comment_count from the like and comment tables.
+
+    Runs as two set-based UPDATEs with correlated counts, so the whole table
+    is repaired in a single pass per counter. Returns the number of images
+    whose stored counters had drifted.
+    """
+    like_total = (
+        select(func.count(Like.id))
+        .where(Like.image_id == Image.id)
+        .scalar_subquery()
+    )
+    comment_total = (
+        select(func.count(Comment.id))
+        .where(Comment.image_id == Image.id)
+        .scalar_subquery()
+    )
+
+    drifted = conn.execute(
+        update(Image)
+        .where((Image.like_count != like_total) | (Image.comment_count != comment_total))
+        .values(like_count=like_total, comment_count=comment_total)
+    )
+    return drifted.rowcount
+
+def recompute_unread_counts(conn):
+    """Recompute User.unread_count from unread Notification rows."""
+    unread_total = (
+        select(func.count(Notification.id))
+        .where(Notification.user_id == User.id, Notification.is_read.is_(False))
+        .scalar_subquery()
+    )
+
+    drifted = conn.execute(
+        update(User)
+        .where(User.unread_count != unread_total)
+        .values(unread_count=unread_total)
+    )
+    return drifted.rowcount
+
+def recompute_blob_refs(conn):
+    """Rebuild Blob rows and ref_count from Image.content_hash.
+
+    Content hashes with no Blob row (e.g. images imported without their
+    blobs) get one, copied from one of their images, so a later upload
+    of the same bytes shares it instead of owning the files alone.
+    Returns the number of blobs created or corrected.
+    """
+    missing = (
+        select(func.min(Image.id))
+        .where(
+            Image.content_hash.isnot(None),
+            ~exists().where(Blob.hash == Image.content_hash)
+        )
+        .group_by(Image.content_hash)
+    )
+    rows = conn.execute(
+        select(Image.content_hash, Image.filename, Image.status, Image.derivatives)
+        .where(Image.id.in_(missing))
+    ).all()
+    if rows:
+        conn.execute(insert(Blob), [
+            {'hash': digest, 'filename': filename, 'status': status, 'derivatives': derivatives, 'ref_count': 0}
+            for digest, filename, status, derivatives in rows
+        ])
+
+    ref_total = (
+        select(func.count(Image.id))
+        .where(Image.content_hash == Blob.hash)
+        .scalar_subquery()
+    )
+    drifted = conn.execute(
+        update(Blob)
+        .where(Blob.ref_count != ref_total)
+        .values(ref_count=ref_total)
+    )
+    return len(rows) + drifted.rowcount
+
+def repair_counters():
+    """Repair all denormalized counters; expects an application context."""
+    with db.engine.begin() as conn:
+        drifted = recompute_counters(conn)
+        unread_drifted = recompute_unread_counts(conn)
+        blobs_drifted = recompute_blob_refs(conn)
+    print(f"Recomputed image counters ({drifted} images corrected)")
+    print(f"Recomputed unread notification counts ({unread_drifted} users corrected)")
+    print(f"Recomputed blob references ({blobs_drifted} blobs corrected)")
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from app import create_app
+
+    load_dotenv()
+
+    with create_app().app_context():
+        repair_counters()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import uuid
+from flask import current_app
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Blob
+from utils import DERIVATIVE_FORMATS, derivative_filename
+
+class LocalBlobStore:
+    """Content-addressed upload storage on the local filesystem.
+
+    Blobs are named by the sha256 of the uploaded bytes and sharded into
+    nested hash-prefix directories (ab/cd/abcd...), so no directory grows
+    past a few thousand entries and identical uploads map to one name.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    SHARD_DEPTH = 2
+    SHARD_WIDTH = 2
+
+    def __init__(self, root):
+        self.root = root
+
+    def blob_name(self, digest, suffix=''):
+        shards = [
+            digest[i * self.SHARD_WIDTH:(i + 1) * self.SHARD_WIDTH]
+            for i in range(self.SHARD_DEPTH)
+        ]
+        return '/'.join(shards + [digest + suffix])
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def spool(self, stream):
+        """Copy `stream` into the raw staging area, hashing it on the way.
+
+        Returns (digest, raw_path). Nothing is decoded here, so the only
+        cost is one sequential, chunked pass over the bytes.
+        """
+        raw_folder = os.path.join(self.root, 'raw')
+        os.makedirs(raw_folder, exist_ok=True)
+        raw_path = os.path.join(raw_folder, f"{uuid.uuid4()}.upload")
+
+        # Streams from IngestRequest were already hashed while being received
+        precomputed = getattr(stream, 'hexdigest', None)
+        digest = None if precomputed else hashlib.sha256()
+
+        stream.seek(0)
+        with open(raw_path, 'wb') as out:
+            for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b''):
+                if digest:
+                    digest.update(chunk)
+                out.write(chunk)
+
+        return precomputed() if precomputed else digest.hexdigest(), raw_path
+
+    def remove(self, filename, derivatives=None):
+        """Delete a published image and all of its derivative files."""
+        names = {filename}
+        for size in derivatives or ():
+            for fmt, _, _, _ in DERIVATIVE_FORMATS:
+                names.add(derivative_filename(filename, size, fmt))
+
+        for name in names:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+def get_blob_store(app=None):
+    app = app or current_app._get_current_object()
+    store = app.extensions.get('blob_store')
+    if store is None:
+        store = app.extensions.setdefault('blob_store', LocalBlobStore(app.config['UPLOAD_FOLDER']))
+    return store
+
+def store_upload(file):
+    """Spool an upload into the store and return (digest, filename, raw_path).
+
+    `filename` is the content-addressed name the processed image is
+    published under; the raw bytes wait in the staging area until
+    process_image runs or the upload turns out to be a duplicate.
+    """
+    store = get_blob_store()
+    digest, raw_path = store.spool(file.stream)
+    return digest, store.blob_name(digest, '.jpg'), raw_path
+
+def acquire_blob(digest, filename):
+    """Take a reference on the blob for `digest`, creating it if needed.
+
+    Returns (blob, created). The caller owns the transaction and must
+    commit; a concurrent insert of the same digest is treated as an
+    existing blob.
+    """
+    for _ in range(2):
+        updated = db.session.execute(
+            update(Blob)
+            .where(Blob.hash == digest)
+            .values(ref_count=Blob.ref_count + 1)
+        )
+        if updated.rowcount:
+            blob = db.session.get(Blob, digest, populate_existing=True)
+            return blob, False
+
+        blob = Blob(hash=digest, filename=filename, ref_count=1)
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+            return blob, True
+        except IntegrityError:
+            continue
+
+    raise RuntimeError(f"Could not acquire blob {digest}")
+
+def release_blob(digest):
+    """Drop a reference on a blob.
+
+    Returns the Blob row if this was the last reference (the row is
+    deleted in the current transaction and its files should be removed
+    once it commits), otherwise None.
+    """
+    db.session.execute(
+        update(Blob)
+        .where(Blob.hash == digest)
+        .values(ref_count=Blob.ref_count - 1)
+    )
+    blob = db.session.get(Blob, digest, populate_existing=True)
+    if blob is None or blob.ref_count > 0:
+        return None
+
+    db.session.execute(delete(Blob).where(Blob.hash == digest))
+    db.session.expunge(blob)
+    return blob
@@ -1,44 +1,127 @@
+import base64
+import binascii
 import os
-from PIL import Image as PILImage
+from datetime import datetime
 from flask import current_app
-import uuid
 
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Derivatives generated for every upload, largest first so each one can be
+# resampled from the previous, already reduced, image
+DERIVATIVE_SIZES = (
+    ('full', 2000),
+    ('medium', 1080),
+    ('thumb', 400),
+)
+
+DERIVATIVE_FORMATS = (
+    ('jpeg', 'jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    ('webp', 'webp', 'WEBP', {'quality': 80, 'method': 4}),
+)
+
+def derivative_filename(filename, size, fmt):
+    # The full JPEG keeps the published filename so existing links still work
+    stem, _ = os.path.splitext(filename)
+    ext = next(ext for name, ext, _, _ in DERIVATIVE_FORMATS if name == fmt)
+    if size == 'full' and fmt == 'jpeg':
+        return f"{stem}.{ext}"
+    return f"{stem}_{size}.{ext}"
+
+def _fit(size, max_side):
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def process_image(raw_path, filepath, max_pixels=None):
+    """Decode an upload once and write every derivative next to `filepath`.
+
+    Runs in the processing pool's worker processes, so it must only depend
+    on its arguments and never on the app or request context. Returns the
+    {size: [width, height]} map recorded on Image.derivatives.
+    """
+    folder = os.path.dirname(filepath)
+    filename = os.path.basename(filepath)
+    os.makedirs(folder, exist_ok=True)
+
+    # Pillow is imported here so the web process only loads it once an
+    # upload actually needs processing
+    from PIL import Image as PILImage
+
+    image = PILImage.open(raw_path)
+
+    # Opening only parses the header, so the budget is enforced before any
+    # pixel data is decoded
+    width, height = image.size
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(f"Image has {width * height} pixels, limit is {max_pixels}")
+
+    # Let libjpeg do DCT-domain downscaling while decoding, which bounds the
+    # decoded size by the largest derivative; this is a no-op for other
+    # formats, whose decoded size is bounded by max_pixels instead
+    largest = DERIVATIVE_SIZES[0][1]
+    image.draft('RGB', _fit(image.size, largest))
+
+    # Convert to RGB if necessary
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    derivatives = {}
+    for size, max_side in DERIVATIVE_SIZES:
+        target = _fit(image.size, max_side)
+        if target != image.size:
+            image = image.resize(target, PILImage.Resampling.LANCZOS, reducing_gap=3.0)
+
+        for fmt, _, pil_format, options in DERIVATIVE_FORMATS:
+            out = os.path.join(folder, derivative_filename(filename, size, fmt))
+            image.save(out, pil_format, **options)
+
+        derivatives[size] = list(image.size)
+
+    os.remove(raw_path)
+    return derivatives
+
 def save_image(file):
+    from storage import get_blob_store, store_upload
+
     if not allowed_file(file.filename):
         return None
-    
-    # Generate unique filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    filename = f"{uuid.uuid4()}.{ext}"
-    
-    # Ensure upload directory exists
-    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    
-    # Open and process image
-    image = PILImage.open(file)
-    
-    # Convert to RGB if necessary
-    if image.mode in ('RGBA', 'P'):
-        image = image.convert('RGB')
-    
-    # Resize if too large (max 2000px on longest side)
-    max_size = (2000, 2000)
-    image.thumbnail(max_size, PILImage.Resampling.LANCZOS)
-    
-    # Save processed image
-    image.save(filepath, 'JPEG', quality=85)
-    
+
+    _, filename, raw_path = store_upload(file)
+    filepath = get_blob_store().path(filename)
+
+    # Identical bytes were already processed under the same name
+    if os.path.exists(filepath):
+        os.remove(raw_path)
+        return filename
+
+    try:
+        process_image(raw_path, filepath, current_app.config.get('IMAGE_MAX_PIXELS'))
+    except Exception:
+        os.remove(raw_path)
+        raise
+
     return filename
 
+def encode_cursor(created_at, row_id):
+    """Opaque keyset cursor for listings ordered by (created_at, id)."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
 def send_notification_email(user_email, notification_type, source_username, image_id=None):
-    # This is a placeholder for email functionality
-    # In production, integrate with services like SendGrid, Mailgun, etc.
-    print(f"Notification email to {user_email}: {notification_type} from {source_username}")
-    # Implementation would go here for actual email sending
-    pass
\ No newline at end of file
+    # Single immediate send; request handlers should go through
+    # notifications.notify so emails are batched off the request path
+    from notifications import Mailer, build_notification_email
+
+    message = build_notification_email(user_email, notification_type, [source_username], 1)
+    Mailer(current_app.config).send_batch([message])
@@ -0,0 +1,95 @@
+import re
+from functools import lru_cache
+from flask import current_app
+
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+def is_valid_email(email):
+    return isinstance(email, str) and EMAIL_RE.match(email) is not None
+
+class PhoneValidator:
+    """Normalizes phone numbers to E.164 with memoized results.
+
+    phonenumbers loads per-region metadata modules on first use. The
+    configured regions are loaded here, at startup, so no request pays
+    for it. With no regions configured any region is accepted and the
+    library itself is only imported on the first number normalized.
+    """
+
+    def __init__(self, regions=(), default_region=None, cache_size=10000):
+        self.regions = frozenset(region.upper() for region in regions)
+        self.default_region = default_region
+        self._phonenumbers = None
+
+        preload = self.regions | ({default_region} if default_region else set())
+        if preload:
+            pn = self._load()
+            for region in preload:
+                pn.PhoneMetadata.metadata_for_region(region)
+
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _load(self):
+        if self._phonenumbers is None:
+            import phonenumbers
+            self._phonenumbers = phonenumbers
+        return self._phonenumbers
+
+    def _normalize(self, raw):
+        """Return the E.164 form of `raw`, or None if it is not valid."""
+        pn = self._load()
+        try:
+            parsed = pn.parse(raw, self.default_region)
+        except pn.NumberParseException:
+            return None
+
+        if not pn.is_valid_number(parsed):
+            return None
+        if self.regions and pn.region_code_for_number(parsed) not in self.regions:
+            return None
+
+        return pn.format_number(parsed, pn.PhoneNumberFormat.E164)
+
+def create_phone_validator(config):
+    regions = [r.strip() for r in config.get('PHONE_REGIONS', '').split(',') if r.strip()]
+    return PhoneValidator(
+        regions=regions,
+        default_region=config.get('PHONE_DEFAULT_REGION') or None,
+        cache_size=config.get('PHONE_CACHE_SIZE', 10000)
+    )
+
+def get_phone_validator(app=None):
+    app = app or current_app._get_current_object()
+    validator = app.extensions.get('phone_validator')
+    if validator is None:
+        validator = app.extensions.setdefault('phone_validator', create_phone_validator(app.config))
+    return validator
+
+def normalize_phone(phone):
+    if not isinstance(phone, str):
+        return None
+    return get_phone_validator().normalize(phone.strip())
+
+def validate_user_records(records):
+    """Batch validation for bulk user import.
+
+    Yields (record, error) for each input dict; valid records come back
+    with their phone normalized to E.164 and error None.
+    """
+    validator = get_phone_validator()
+    for record in records:
+        if not is_valid_email(record.get('email')):
+            yield record, 'Invalid email format'
+            continue
+
+        phone = validator.normalize(str(record.get('phone', '')).strip())
+        if phone is None:
+            yield record, 'Invalid phone number'
+            continue
+
+        yield dict(record, phone=phone), None
+
+def init_validation(app):
+    # Load the configured phone metadata at startup rather than on the
+    # first registration
+    get_phone_validator(app)
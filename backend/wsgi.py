@@ -0,0 +1,6 @@
+# Entry point for WSGI servers, e.g. `gunicorn -w 4 wsgi:app`
+from dotenv import load_dotenv
+from app import create_app
+
+load_dotenv()
+app = create_app()
@@ -1,6 +1,7 @@
 class Gallery {
     constructor() {
         this.currentPage = 1;
+        this.nextCursor = null;
         this.hasMore = true;
         this.loading = false;
         this.init();
@@ -24,6 +25,7 @@ class Gallery {
         if (userFilter) {
             userFilter.addEventListener('change', (e) => {
                 this.currentPage = 1;
+                this.nextCursor = null;
                 this.hasMore = true;
                 this.loadImages(e.target.value);
             });
@@ -42,10 +44,13 @@ class Gallery {
 
         try {
             const params = new URLSearchParams({
-                page: this.currentPage,
                 limit: 12
             });
             
+            if (this.nextCursor) {
+                params.append('cursor', this.nextCursor);
+            }
+            
             if (userId) {
                 params.append('user_id', userId);
             }
@@ -74,7 +79,8 @@ class Gallery {
 
             result.images.forEach(image => this.renderImage(image));
             
-            this.hasMore = this.currentPage < result.pages;
+            this.nextCursor = result.next_cursor;
+            this.hasMore = Boolean(result.next_cursor);
             this.currentPage++;
 
         } catch (error) {
@@ -98,7 +104,10 @@ class Gallery {
                 ${image.caption ? `<p>${this.escapeHtml(image.caption)}</p>` : ''}
             </div>
             <div class="image-container">
-                <img src="/uploads/${image.filename}" alt="${this.escapeHtml(image.caption || 'Image')}" loading="lazy">
+                <picture>
+                    <source type="image/webp" srcset="${image.urls.thumb.webp} 400w, ${image.urls.medium.webp} 1080w" sizes="(max-width: 600px) 100vw, 400px">
+                    <img src="${image.urls.thumb.jpeg}" srcset="${image.urls.thumb.jpeg} 400w, ${image.urls.medium.jpeg} 1080w" sizes="(max-width: 600px) 100vw, 400px" alt="${this.escapeHtml(image.caption || 'Image')}" loading="lazy">
+                </picture>
             </div>
             <div class="image-actions">
                 <button class="like-btn ${image.user_has_liked ? 'liked' : ''}" 
@@ -56,7 +56,10 @@ class Profile {
             imageCard.className = 'image-card';
             imageCard.innerHTML = `
                 <div class="image-container">
-                    <img src="/uploads/${image.filename}" alt="${image.caption || 'Image'}">
+                    <picture>
+                        <source type="image/webp" srcset="${image.urls.thumb.webp}">
+                        <img src="${image.urls.thumb.jpeg}" alt="${image.caption || 'Image'}">
+                    </picture>
                 </div>
                 <div class="image-info">
                     <p>${image.caption || ''}</p>
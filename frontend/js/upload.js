@@ -60,7 +60,7 @@ class ImageUpload {
             const result = await response.json();
 
             if (response.ok) {
-                alert('Image uploaded successfully!');
+                alert('Image uploaded! It will appear in the gallery once processing finishes.');
                 e.target.reset();
                 document.getElementById('imagePreview').style.display = 'none';
                 window.location.href = 'gallery.html';